@@ -0,0 +1,49 @@
+"""add indexes for feed, owner and vote lookups
+
+Revision ID: 068e1f5142d0
+Revises: 5372926217a6
+Create Date: 2025-03-26 20:33:58.104672
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '068e1f5142d0'
+down_revision: Union[str, None] = '5372926217a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # CONCURRENTLY can't run inside a transaction block, the indexes are built outside of the migration one
+    # so the tables keep taking writes meanwhile
+    with op.get_context().autocommit_block():
+
+        # Feed ordering & keyset seek: ORDER BY created_at DESC, id DESC (scanned backwards)
+        op.create_index("ix_posts_created_at_id", "posts", ["created_at", "id"], postgresql_concurrently=True)
+
+        # Owner lookups & the cascaded deletes of a user's posts
+        op.create_index("ix_posts_owner_id", "posts", ["owner_id"], postgresql_concurrently=True)
+
+        # Reverse vote lookups (the (post_id, user_id) primary key only serves post_id leading queries)
+        op.create_index("ix_votes_user_id", "votes", ["user_id"], postgresql_concurrently=True)
+
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    with op.get_context().autocommit_block():
+
+        op.drop_index("ix_votes_user_id", table_name="votes", postgresql_concurrently=True)
+        op.drop_index("ix_posts_owner_id", table_name="posts", postgresql_concurrently=True)
+        op.drop_index("ix_posts_created_at_id", table_name="posts", postgresql_concurrently=True)
+
+    pass
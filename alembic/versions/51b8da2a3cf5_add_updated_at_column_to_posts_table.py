@@ -0,0 +1,37 @@
+"""add updated_at column to posts table
+
+Revision ID: 51b8da2a3cf5
+Revises: 068e1f5142d0
+Create Date: 2025-04-01 18:25:49.730215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '51b8da2a3cf5'
+down_revision: Union[str, None] = '068e1f5142d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # The existing posts were last modified when they were created
+    op.add_column("posts", sa.Column("updated_at", sa.TIMESTAMP(timezone=True), nullable=True))
+    op.execute("UPDATE posts SET updated_at = created_at")
+    op.alter_column("posts", "updated_at", nullable=False, server_default=sa.text("NOW()"))
+
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_column("posts", "updated_at")
+
+    pass
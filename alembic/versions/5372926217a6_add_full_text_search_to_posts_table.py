@@ -0,0 +1,47 @@
+"""add full text search to posts table
+
+Revision ID: 5372926217a6
+Revises: 95be6e216947
+Create Date: 2025-03-24 19:02:16.481907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5372926217a6'
+down_revision: Union[str, None] = '95be6e216947'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # Ranked full text search: a generated tsvector (title weighs more than content) behind a GIN index
+    op.add_column("posts", sa.Column("search_vector", postgresql.TSVECTOR(),
+                                     sa.Computed("setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', content), 'B')", persisted=True),
+                                     nullable=True))
+    op.create_index("ix_posts_search_vector", "posts", ["search_vector"], postgresql_using="gin")
+
+    # Substring search fallback: trigram GIN indexes serve LIKE / ILIKE '%term%' without a sequential scan
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index("ix_posts_title_trgm", "posts", ["title"], postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"})
+    op.create_index("ix_posts_content_trgm", "posts", ["content"], postgresql_using="gin", postgresql_ops={"content": "gin_trgm_ops"})
+
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_index("ix_posts_content_trgm", table_name="posts")
+    op.drop_index("ix_posts_title_trgm", table_name="posts")
+    op.drop_index("ix_posts_search_vector", table_name="posts")
+    op.drop_column("posts", "search_vector")
+
+    pass
@@ -0,0 +1,78 @@
+"""add vote_count column to posts table
+
+Revision ID: 58e3dcba7c7e
+Revises: 289c2a43fb4f
+Create Date: 2025-03-18 20:12:41.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '58e3dcba7c7e'
+down_revision: Union[str, None] = '289c2a43fb4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    op.add_column("posts", sa.Column("vote_count", sa.Integer(), nullable=False, server_default="0"))
+
+    # Backfill the counter from the votes already cast
+    op.execute("""
+        UPDATE posts SET vote_count = counts.n
+        FROM (SELECT post_id, COUNT(*) AS n FROM votes GROUP BY post_id) AS counts
+        WHERE posts.id = counts.post_id
+    """)
+
+    # Statement level triggers keep the counter exact in the same transaction as the vote write,
+    # a multi-row INSERT/DELETE touches each post row once instead of once per vote
+    op.execute("""
+        CREATE FUNCTION votes_count_insert() RETURNS trigger AS $$
+        BEGIN
+            UPDATE posts SET vote_count = posts.vote_count + delta.n
+            FROM (SELECT post_id, COUNT(*) AS n FROM new_votes GROUP BY post_id) AS delta
+            WHERE posts.id = delta.post_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE FUNCTION votes_count_delete() RETURNS trigger AS $$
+        BEGIN
+            UPDATE posts SET vote_count = posts.vote_count - delta.n
+            FROM (SELECT post_id, COUNT(*) AS n FROM old_votes GROUP BY post_id) AS delta
+            WHERE posts.id = delta.post_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER votes_count_insert AFTER INSERT ON votes
+        REFERENCING NEW TABLE AS new_votes
+        FOR EACH STATEMENT EXECUTE FUNCTION votes_count_insert()
+    """)
+    op.execute("""
+        CREATE TRIGGER votes_count_delete AFTER DELETE ON votes
+        REFERENCING OLD TABLE AS old_votes
+        FOR EACH STATEMENT EXECUTE FUNCTION votes_count_delete()
+    """)
+
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.execute("DROP TRIGGER votes_count_delete ON votes")
+    op.execute("DROP TRIGGER votes_count_insert ON votes")
+    op.execute("DROP FUNCTION votes_count_delete()")
+    op.execute("DROP FUNCTION votes_count_insert()")
+    op.drop_column("posts", "vote_count")
+
+    pass
@@ -0,0 +1,37 @@
+"""add updated_at column to users table
+
+Revision ID: 635fae3c19e3
+Revises: 865742b5fc65
+Create Date: 2025-04-15 21:47:06.382914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '635fae3c19e3'
+down_revision: Union[str, None] = '865742b5fc65'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # The existing users were last modified when they were created
+    op.add_column("users", sa.Column("updated_at", sa.TIMESTAMP(timezone=True), nullable=True))
+    op.execute("UPDATE users SET updated_at = created_at")
+    op.alter_column("users", "updated_at", nullable=False, server_default=sa.text("NOW()"))
+
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_column("users", "updated_at")
+
+    pass
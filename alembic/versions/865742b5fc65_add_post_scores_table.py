@@ -0,0 +1,96 @@
+"""add post_scores table
+
+Revision ID: 865742b5fc65
+Revises: 51b8da2a3cf5
+Create Date: 2025-04-08 19:02:17.415306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '865742b5fc65'
+down_revision: Union[str, None] = '51b8da2a3cf5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # Precomputed scores of the ranked feeds, filled & kept fresh by 'app.ranking' from the posts queued below (python -m app.ranking fills it up front)
+    op.create_table("post_scores",
+                    sa.Column("post_id", sa.Integer(), sa.ForeignKey("posts.id", ondelete="CASCADE", onupdate="CASCADE"), primary_key=True, nullable=False),
+                    sa.Column("hot", sa.Float(), nullable=False),
+                    sa.Column("top", sa.Integer(), nullable=False),
+                    sa.Column("refreshed_at", sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text("NOW()")))
+
+    # Top-K reads: ORDER BY <score> DESC, post_id DESC (scanned backwards)
+    op.create_index("ix_post_scores_hot", "post_scores", ["hot", "post_id"])
+    op.create_index("ix_post_scores_top", "post_scores", ["top", "post_id"])
+
+    # Posts whose scores are due for a refresh, drained by 'app.ranking' (a refresh only reads the queued posts)
+    op.create_table("post_score_queue",
+                    sa.Column("post_id", sa.Integer(), sa.ForeignKey("posts.id", ondelete="CASCADE", onupdate="CASCADE"), primary_key=True, nullable=False),
+                    sa.Column("queued_at", sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text("NOW()")))
+
+    # Statement level triggers queue the new posts & the voted ones in the same transaction as the write,
+    # a post queued already stays queued once (the votes deleted in cascade of their post don't queue it)
+    op.execute("""
+        CREATE FUNCTION queue_voted_post_scores() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO post_score_queue (post_id)
+            SELECT DISTINCT posts.id FROM changed_votes JOIN posts ON posts.id = changed_votes.post_id
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE FUNCTION queue_new_post_scores() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO post_score_queue (post_id) SELECT id FROM new_posts ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER post_scores_queue_vote_insert AFTER INSERT ON votes
+        REFERENCING NEW TABLE AS changed_votes
+        FOR EACH STATEMENT EXECUTE FUNCTION queue_voted_post_scores()
+    """)
+    op.execute("""
+        CREATE TRIGGER post_scores_queue_vote_delete AFTER DELETE ON votes
+        REFERENCING OLD TABLE AS changed_votes
+        FOR EACH STATEMENT EXECUTE FUNCTION queue_voted_post_scores()
+    """)
+    op.execute("""
+        CREATE TRIGGER post_scores_queue_post_insert AFTER INSERT ON posts
+        REFERENCING NEW TABLE AS new_posts
+        FOR EACH STATEMENT EXECUTE FUNCTION queue_new_post_scores()
+    """)
+
+    # Queue the existing posts, none has a score yet
+    op.execute("INSERT INTO post_score_queue (post_id) SELECT id FROM posts")
+
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.execute("DROP TRIGGER post_scores_queue_post_insert ON posts")
+    op.execute("DROP TRIGGER post_scores_queue_vote_delete ON votes")
+    op.execute("DROP TRIGGER post_scores_queue_vote_insert ON votes")
+    op.execute("DROP FUNCTION queue_new_post_scores()")
+    op.execute("DROP FUNCTION queue_voted_post_scores()")
+    op.drop_table("post_score_queue")
+
+    op.drop_index("ix_post_scores_top", table_name="post_scores")
+    op.drop_index("ix_post_scores_hot", table_name="post_scores")
+    op.drop_table("post_scores")
+
+    pass
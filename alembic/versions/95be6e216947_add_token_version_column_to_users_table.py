@@ -0,0 +1,34 @@
+"""add token_version column to users table
+
+Revision ID: 95be6e216947
+Revises: 58e3dcba7c7e
+Create Date: 2025-03-20 18:41:07.552310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '95be6e216947'
+down_revision: Union[str, None] = '58e3dcba7c7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    op.add_column("users", sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"))
+
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_column("users", "token_version")
+
+    pass
@@ -0,0 +1,375 @@
+
+# 3RD PARTY IMPORTS
+from decouple import config
+
+# LOCAL IMPORTS
+from app.database import DB_REPLICA_CHECK_INTERVAL, DB_REPLICA_MAX_LAG, DB_REPLICA_URLS
+
+# BUILT-IN IMPORTS
+from collections import OrderedDict
+from typing import Iterable, Optional, Set
+import hashlib
+import json
+import math
+import threading
+import time
+
+
+
+
+# CACHE SETTINGS
+CACHE_BACKEND = config('CACHE_BACKEND', default='memory')          # memory | redis | none
+CACHE_URL = config('CACHE_URL', default='redis://localhost:6379/0')
+CACHE_TTL = config('CACHE_TTL', default=30, cast=int)               # Seconds, bounds the staleness across workers
+CACHE_MAX_ENTRIES = config('CACHE_MAX_ENTRIES', default=10000, cast=int)
+
+
+
+
+# IN-PROCESS BACKEND
+class MemoryCache:
+
+    """
+    TTL + LRU cache local to the worker process. The invalidations only reach this process,
+    with several workers the other ones serve their copy until CACHE_TTL (use the Redis backend to share it).
+    The tags live outside the LRU, a tag evicted before the entries it points to would leave them out of reach of the invalidations
+    """
+
+    def __init__(self, maxsize: int):
+
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._tags: dict[str, tuple[Set[str], float]] = {}
+        self._tags_limit = maxsize   # Tag count that triggers dropping the expired tags
+        self._counters: dict[str, tuple[int, float]] = {}   # Kept apart so the LRU never evicts them
+        self._counters_limit = maxsize   # Counter count that triggers dropping the expired counters
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+    # Approximate footprint of an entry (values are bytes, tags are sets of keys)
+    @staticmethod
+    def _size(key: str, value) -> int:
+        return len(key) + (len(value) if isinstance(value, bytes) else sum(len(k) for k in value))
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= self._size(key, entry[0])
+        return entry
+
+    def _put(self, key: str, value: bytes, ttl: int) -> None:
+        self._pop(key)
+        self._entries[key] = (value, time.time() + ttl)
+        self._bytes += self._size(key, value)
+        while len(self._entries) > self.maxsize:
+            self._pop(next(iter(self._entries)))
+
+    def _pop_tag(self, tag: str) -> Set[str]:
+        entry = self._tags.pop(tag, None)
+        if entry is None:
+            return set()
+        self._bytes -= self._size(tag, entry[0])
+        return entry[0] if entry[1] > time.time() else set()
+
+    def _tag(self, tag: str, key: str, ttl: int) -> None:
+        keys = self._pop_tag(tag) | {key}
+        self._tags[tag] = (keys, time.time() + ttl)
+        self._bytes += self._size(tag, keys)
+
+        # The tags of the entries gone by TTL are dropped once they pile up
+        if len(self._tags) > self._tags_limit:
+            now = time.time()
+            for expired in [tag for tag, (_, expiry) in self._tags.items() if expiry <= now]:
+                self._pop_tag(expired)
+            self._tags_limit = max(self.maxsize, 2 * len(self._tags))
+
+    def _live(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _counter(self, key: str) -> Optional[int]:
+        entry = self._counters.get(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key in self._counters:
+                value = self._counter(key)
+                return None if value is None else str(value).encode()
+            return self._live(key)
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        with self._lock:
+            self._put(key, value, ttl)
+
+    async def set_tagged(self, key: str, value: bytes, tags: Iterable[str], ttl: int) -> None:
+        with self._lock:
+            self._put(key, value, ttl)
+            for tag in tags:
+                self._tag(tag, key, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+
+    async def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        with self._lock:
+            value = (self._counter(key) or 0) + 1
+            self._counters[key] = (value, time.time() + ttl if ttl else float("inf"))
+
+            # The counters gone by TTL are dropped once they pile up
+            if len(self._counters) > self._counters_limit:
+                now = time.time()
+                self._counters = {key: entry for key, entry in self._counters.items() if entry[1] > now}
+                self._counters_limit = max(self.maxsize, 2 * len(self._counters))
+
+            return value
+
+    async def pop_tag(self, tag: str) -> Set[str]:
+        with self._lock:
+            return self._pop_tag(tag)
+
+    async def memory_bytes(self) -> int:
+        with self._lock:
+            return self._bytes
+
+
+# REDIS BACKEND
+class RedisCache:
+
+    """
+    Cache shared by every worker, its keys live under 'prefix'. Takes any 'redis.asyncio' compatible client, so a local fake
+    (e.g. 'fakeredis.aioredis.FakeRedis()') can stand in for a server. Under memory pressure the server should evict
+    by TTL ('maxmemory-policy volatile-ttl'): a tag is refreshed with every entry it points to, so the entries go first
+    """
+
+    def __init__(self, client, prefix: str = "cache:"):
+
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCache":
+
+        # Optional dependency guard
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+
+        return cls(redis.from_url(url))
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def _tag(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self._key(key))
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        await self.client.set(self._key(key), value, ex=ttl)
+
+    async def set_tagged(self, key: str, value: bytes, tags: Iterable[str], ttl: int) -> None:
+
+        # The entry & its tags in one transaction
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(key), value, ex=ttl)
+            for tag in tags:
+                pipe.sadd(self._tag(tag), key).expire(self._tag(tag), ttl)
+            await pipe.execute()
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self._key(key) for key in keys))
+
+    async def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        if not ttl:
+            return await self.client.incr(self._key(key))
+        async with self.client.pipeline(transaction=True) as pipe:
+            value, _ = await pipe.incr(self._key(key)).expire(self._key(key), ttl).execute()
+        return value
+
+    async def pop_tag(self, tag: str) -> Set[str]:
+        async with self.client.pipeline(transaction=True) as pipe:
+            members, _ = await pipe.smembers(self._tag(tag)).delete(self._tag(tag)).execute()
+        return {m.decode() if isinstance(m, bytes) else m for m in members}
+
+    async def memory_bytes(self) -> int:
+
+        # Same measure as the in-process backend over the cache's own keys (the server may hold other data),
+        # SCAN based so it costs O(keys): only the admin endpoint asks for it
+        total = 0
+        tags = self._tag("").encode()
+        batch = []
+
+        async def measure(keys: list) -> int:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    if key.startswith(tags):
+                        pipe.smembers(key)
+                    else:
+                        pipe.strlen(key)
+                values = await pipe.execute()
+            return sum(len(key) + (value if isinstance(value, int) else sum(len(m) for m in value)) for key, value in zip(keys, values))
+
+        async for key in self.client.scan_iter(match=f"{self.prefix}*", count=1000):
+            batch.append(key if isinstance(key, bytes) else key.encode())
+            if len(batch) == 1000:
+                total += await measure(batch)
+                batch = []
+
+        return total + (await measure(batch) if batch else 0)
+
+
+
+
+# POST READS CACHE
+class PostCache:
+
+    """
+    Read-through cache of the serialized post reads.
+
+    - Single posts live under 'post:{id}:{version}'. Invalidating a post bumps its version ('post:{id}:v'), so a copy read
+      from the DB before the invalidation (e.g. by a request still running its query) is written under a key no one reads.
+    - Feed pages live under 'feed:{generation}:{digest of the query params}', and each post served in a page tags it
+      ('post-feeds:{id}') so voting a post drops exactly the pages that show it.
+    - Creating, editing or deleting a post can move it in or out of any page (searches included), so it bumps the feed generation instead.
+    - Refreshing the scores reorders the ranked pages only, they carry a second (ranking) generation.
+    - A replica read may predate the last invalidation (replay lag), for 'settle' seconds after it ('post:{id}:{version}:settling',
+      'feed:settling') the reads from a replica aren't kept, the ones from the primary are.
+    """
+
+    def __init__(self, backend, ttl: int, settle: int = 0):
+
+        self.backend = backend
+        self.ttl = ttl
+        self.settle = settle
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    # The entries hold the response headers (ETag, Last-Modified) in a first line and then the JSON payload
+    @staticmethod
+    def _pack(headers: dict, payload: bytes) -> bytes:
+        return json.dumps(headers).encode() + b"\n" + payload
+
+    async def _lookup(self, key: str) -> Optional[tuple[dict, bytes]]:
+        value = await self.backend.get(key)
+        self._count(value is not None)
+        if value is None:
+            return None
+        headers, payload = value.split(b"\n", 1)
+        return json.loads(headers), payload
+
+    # Replica reads of these scopes aren't kept until the replicas replayed the invalidation (markers outside the LRU)
+    async def _settling(self, *scopes: str) -> None:
+        if self.settle:
+            for scope in scopes:
+                await self.backend.incr(f"{scope}:settling", self.settle)
+
+    async def _settled(self, scope: str, replica: bool) -> bool:
+        return not replica or not self.settle or await self.backend.get(f"{scope}:settling") is None
+
+    # SINGLE POSTS (the key is taken before the DB read)
+    async def post_key(self, id: int) -> str:
+        version = int(await self.backend.get(f"post:{id}:v") or 0)
+        return f"post:{id}:{version}"
+
+    async def get_post(self, key: str) -> Optional[tuple[dict, bytes]]:
+        return await self._lookup(key)
+
+    async def set_post(self, key: str, headers: dict, payload: bytes, replica: bool = False) -> None:
+        if await self._settled(key, replica):
+            await self.backend.set(key, self._pack(headers, payload), self.ttl)
+
+    # FEED PAGES
+    async def feed_key(self, **params) -> str:
+        generation = int(await self.backend.get("feed:generation") or 0)
+        if params.get("sort", "new") != "new":
+            generation = f"{generation}.{int(await self.backend.get('feed:ranking') or 0)}"
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"feed:{generation}:{digest}"
+
+    async def get_feed(self, key: str) -> Optional[tuple[dict, bytes]]:
+        return await self._lookup(key)
+
+    async def set_feed(self, key: str, headers: dict, payload: bytes, post_ids: Iterable[int], replica: bool = False) -> None:
+        if await self._settled("feed", replica):
+            await self.backend.set_tagged(key, self._pack(headers, payload), [f"post-feeds:{id}" for id in post_ids], self.ttl)
+
+    # INVALIDATION
+    async def invalidate_post(self, id: int) -> None:
+
+        # New version of the post, then drop its previous copy and every feed page it was served in. The version outlives
+        # the copies written under the previous ones (a copy lives 'ttl', written at most a request's duration after the bump)
+        version = await self.backend.incr(f"post:{id}:v", 2 * self.ttl)
+        await self._settling(f"post:{id}:{version}", "feed")
+        feeds = await self.backend.pop_tag(f"post-feeds:{id}")
+        await self.backend.delete(f"post:{id}:{version - 1}", *feeds)
+
+        with self._lock:
+            self.invalidations += 1
+
+    async def invalidate_feeds(self) -> None:
+
+        # New generation, the pages of the previous one are never read again and age out
+        await self.backend.incr("feed:generation")
+        await self._settling("feed")
+
+        with self._lock:
+            self.invalidations += 1
+
+    async def invalidate_rankings(self) -> None:
+
+        # The scores were refreshed, only the ranked pages ('hot' / 'top') move to a new generation
+        await self.backend.incr("feed:ranking")
+        await self._settling("feed")
+
+        with self._lock:
+            self.invalidations += 1
+
+    async def stats(self) -> dict:
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {"backend": type(self.backend).__name__, "ttl": self.ttl, "hits": self.hits, "misses": self.misses,
+                     "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0, "invalidations": self.invalidations}
+
+        stats["memory_bytes"] = await self.backend.memory_bytes()
+
+        return stats
+
+
+# Cache instance used by the path operations (None when CACHE_BACKEND=none)
+def build_cache() -> Optional[PostCache]:
+
+    if CACHE_BACKEND == "none":
+        return None
+
+    backend = RedisCache.from_url(CACHE_URL) if CACHE_BACKEND == "redis" else MemoryCache(CACHE_MAX_ENTRIES)
+
+    # With replicas, the replica reads are kept once the healthy ones surely replayed the last invalidation
+    settle = math.ceil(DB_REPLICA_MAX_LAG + DB_REPLICA_CHECK_INTERVAL) if DB_REPLICA_URLS else 0
+
+    return PostCache(backend, CACHE_TTL, settle)
+
+
+post_cache = build_cache()
@@ -1,12 +1,24 @@
 
 # 3RD PARTY IMPORTS
-from sqlalchemy import create_engine
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from decouple import config
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
+from decouple import config, Csv
+
+# LOCAL IMPORTS
+from app import oauth2
 
 # BUILT-IN IMPORTS
-from typing import Generator
+from itertools import count
+from typing import AsyncGenerator, Generator, Optional
+import asyncio
+import logging
+import threading
+import time
 
 
 
@@ -18,17 +30,302 @@ DB_HOSTNAME = config('DB_HOSTNAME')
 DB_PORT = config('DB_PORT')
 
 SQLALCHEMY_DATABASE_URL = f'postgresql://{DB_USER}:{DB_PASS}@{DB_HOSTNAME}:{DB_PORT}/{DB_NAME}'
+SQLALCHEMY_ASYNC_DATABASE_URL = f'postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOSTNAME}:{DB_PORT}/{DB_NAME}'
+
+# Connection pool settings (per engine & per worker process)
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=5, cast=int)
+DB_MAX_OVERFLOW = config('DB_MAX_OVERFLOW', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=30, cast=float)
+DB_POOL_RECYCLE = config('DB_POOL_RECYCLE', default=1800, cast=int)
+DB_POOL_PRE_PING = config('DB_POOL_PRE_PING', default=False, cast=bool)
+
+# PgBouncer (transaction pooling) mode: no app side pool and no server side prepared statements
+DB_PGBOUNCER = config('DB_PGBOUNCER', default=False, cast=bool)
+
+# Rows fetched per round trip by the server-side cursors of the exports
+EXPORT_BATCH_SIZE = config('EXPORT_BATCH_SIZE', default=1000, cast=int)
+
+# Read replicas: comma separated 'postgresql+asyncpg://' URLs (none by default, every read goes to the primary)
+DB_REPLICA_URLS = config('DB_REPLICA_URLS', default='', cast=Csv())
+DB_REPLICA_CHECK_INTERVAL = config('DB_REPLICA_CHECK_INTERVAL', default=5.0, cast=float)   # Seconds between health checks
+DB_REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=10.0, cast=float)               # Seconds of replay lag before a replica is skipped
+DB_READ_YOUR_WRITES = config('DB_READ_YOUR_WRITES', default=5.0, cast=float)              # Seconds a user reads from the primary after a write
+
+logger = logging.getLogger(__name__)
+
+
+
+
+# POOL TELEMETRY
+class PoolMetrics:
+
+    """
+    Connection pool counters of one engine, fed by the pool events (connect / checkout / checkin / invalidate)
+    and by the checkout wait measured in the pool itself
+    """
+
+    def __init__(self, name: str):
+
+        self.name = name
+        self.engine = None
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def attach(self, engine) -> None:
+
+        # Listen to the pool events of the engine (the async engines are listened through their sync facade)
+        self.engine = engine
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.timeouts += timed_out
+
+    def snapshot(self) -> dict:
+
+        pool = self.engine.pool if self.engine is not None else None
+
+        with self._lock:
+            return {
+                "engine": self.name,
+                "pool_class": type(pool).__name__ if pool is not None else None,
+                "pool_size": pool.size() if isinstance(pool, QueuePool) else None,
+                "checked_out": self.checkouts - self.checkins,
+                "overflow_in_use": max(0, pool.overflow()) if isinstance(pool, QueuePool) else None,
+                "connects_total": self.connects,
+                "checkouts_total": self.checkouts,
+                "invalidations_total": self.invalidations,
+                "checkout_timeouts_total": self.timeouts,
+                "checkout_wait_seconds_total": round(self.wait_total, 6),
+                "checkout_wait_seconds_avg": round(self.wait_total / self.wait_count, 6) if self.wait_count else 0.0,
+                "checkout_wait_seconds_max": round(self.wait_max, 6),
+            }
+
+
+# Pool class that times how long each checkout waits for a connection (queueing + connecting)
+def _timed_pool_class(base: type[Pool], metrics: PoolMetrics) -> type[Pool]:
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return base._do_get(self)
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            metrics.record_wait(time.perf_counter() - start, timed_out)
+
+    # A class (not an instance attribute) so the pool keeps timing after 'engine.dispose()' recreates it
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+
+
+# Engine keyword arguments for the configured pooling mode
+def _pool_options(queue_pool: type[Pool], metrics: PoolMetrics) -> dict:
+
+    if DB_PGBOUNCER:
+        return {"poolclass": _timed_pool_class(NullPool, metrics)}
+
+    return {
+        "poolclass": _timed_pool_class(queue_pool, metrics),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+# Async engine URL for the configured pooling mode (the query string already in the URL is kept)
+def _async_url(url: str) -> URL:
+
+    if DB_PGBOUNCER:
+        return make_url(url).update_query_dict({"prepared_statement_cache_size": "0"})
+
+    return make_url(url)
+
+
 
 
 # SQLALCHEMY ORM SETTING
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+pool_metrics = PoolMetrics("sync")
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_pool_options(QueuePool, pool_metrics))
+pool_metrics.attach(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine used by the path operations, the requests yield the event loop while waiting on Postgres
+# (expire_on_commit is off so committed objects can still be serialized without an implicit reload)
+# Behind PgBouncer asyncpg must not cache prepared statements, the next transaction may land on another server connection
+async_pool_metrics = PoolMetrics("async")
+async_engine = create_async_engine(
+    _async_url(SQLALCHEMY_ASYNC_DATABASE_URL),
+    connect_args={"statement_cache_size": 0} if DB_PGBOUNCER else {},
+    **_pool_options(AsyncAdaptedQueuePool, async_pool_metrics),
+)
+async_pool_metrics.attach(async_engine.sync_engine)
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+
+
+
+# READ REPLICAS
+class ReplicaSet:
+
+    """
+    Async engines of the read replicas, handed out round robin among the healthy ones. A background task checks
+    every replica (reachable & replay lag under DB_REPLICA_MAX_LAG) each DB_REPLICA_CHECK_INTERVAL seconds,
+    with no healthy replica the reads fall back to the primary
+    """
+
+    def __init__(self, urls: list[str]):
+
+        self.replicas = []
+        for n, url in enumerate(urls):
+            metrics = PoolMetrics(f"replica-{n}")
+            engine = create_async_engine(_async_url(url),
+                                         connect_args={"statement_cache_size": 0} if DB_PGBOUNCER else {},
+                                         **_pool_options(AsyncAdaptedQueuePool, metrics))
+            metrics.attach(engine.sync_engine)
+            self.replicas.append({"engine": engine, "metrics": metrics, "healthy": False, "lag": None,
+                                  "sessions": sessionmaker(engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)})
+        self._next = count()
+        self._task: Optional[asyncio.Task] = None
 
+    @property
+    def engines(self) -> list[AsyncEngine]:
+        return [replica["engine"] for replica in self.replicas]
 
+    def pick(self) -> Optional[sessionmaker]:
 
-# Database instance generator, later will be the dependency in the endpoint definition
+        """Session factory of the next healthy replica, None if there is none"""
+
+        healthy = [replica for replica in self.replicas if replica["healthy"]]
+
+        return healthy[next(self._next) % len(healthy)]["sessions"] if healthy else None
+
+    @staticmethod
+    async def _lag(engine: AsyncEngine) -> float:
+
+        # Seconds since the last replayed transaction, 0 once everything received is replayed (an idle primary sends
+        # nothing new, the replica is current however old its last transaction) and on a server that isn't replaying WAL
+        # (NULL, e.g. the primary standing in for a replica in a local setup)
+        async with engine.connect() as conn:
+            return float((await conn.execute(text(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"))).scalar())
+
+    async def check(self) -> None:
+
+        for replica in self.replicas:
+            try:
+                replica["lag"] = await asyncio.wait_for(self._lag(replica["engine"]), DB_REPLICA_CHECK_INTERVAL)
+                replica["healthy"] = replica["lag"] <= DB_REPLICA_MAX_LAG
+
+            except Exception as e:
+                if replica["healthy"]:
+                    logger.warning("Read replica %s is unhealthy: %s", replica["metrics"].name, e)
+                replica["healthy"], replica["lag"] = False, None
+
+    async def _run(self) -> None:
+
+        while True:
+            await asyncio.sleep(DB_REPLICA_CHECK_INTERVAL)
+            await self.check()
+
+    async def start(self) -> None:
+
+        # First check up front so the replicas take reads right away
+        if self.replicas:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for engine in self.engines:
+            await engine.dispose()
+
+    def stats(self) -> list[dict]:
+        return [{**replica["metrics"].snapshot(), "healthy": replica["healthy"], "lag_seconds": replica["lag"]} for replica in self.replicas]
+
+
+replicas = ReplicaSet(DB_REPLICA_URLS)
+
+
+# Read-your-writes: the users that wrote recently keep reading from the primary (and past the post reads cache) for DB_READ_YOUR_WRITES seconds,
+# keyed on the user id so every token and device of the writer sees its writes
+class RecentWriters:
+
+    def __init__(self, window: float):
+
+        self.window = window
+        self._until: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, user_id: int) -> None:
+
+        now = time.monotonic()
+        with self._lock:
+            self._until[user_id] = now + self.window
+            # Prune the expired entries once in a while so the map stays bounded by the writers of the last window
+            if len(self._until) > 1024:
+                self._until = {key: until for key, until in self._until.items() if until > now}
+
+    def recent(self, user_id: int) -> bool:
+
+        with self._lock:
+            return self._until.get(user_id, 0.0) > time.monotonic()
+
+
+recent_writers = RecentWriters(DB_READ_YOUR_WRITES)
+
+
+# Flag the sessions that committed, their client becomes a recent writer
+@event.listens_for(Session, "after_commit")
+def _flag_commit(session):
+    session.info["committed"] = True
+
+
+
+
+# Database instance generator for the sync code (scripts & commands), blocks the calling thread on every query
 def get_db() -> Generator[Session, None, None]:
 
     db = SessionLocal()
@@ -40,6 +337,42 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+# Async database instance generator, this is the dependency in the endpoint definition (primary, reads & writes)
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+        # The user wrote, its next reads must see it (the principal is left on the request by 'oauth2.get_current_user')
+        principal = getattr(request.state, "principal", None)
+        if db.sync_session.info.get("committed") and principal is not None:
+            recent_writers.mark(principal.id)
+
+
+# Async read-only database instance generator, dependency of the read path operations: a healthy replica,
+# or the primary when there is none or the user wrote in the last DB_READ_YOUR_WRITES seconds.
+# 'db.info' tells the path operation where its reads come from ("replica") and if the user is a recent writer ("recent_writer")
+async def get_read_db(current_user = Depends(oauth2.get_current_user)) -> AsyncGenerator[AsyncSession, None]:
+
+    recent_writer = recent_writers.recent(current_user.id)
+    sessions = None if recent_writer else replicas.pick()
+
+    async with (sessions or AsyncSessionLocal)() as db:
+        db.info.update(replica=sessions is not None, recent_writer=recent_writer)
+        yield db
+
+
+# Server-side cursor streamer for the exports
+async def stream_rows(stmt, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncGenerator[list, None]:
+
+    """
+    Runs 'stmt' on a server-side cursor and yields its rows in batches of 'batch_size', so only one batch is held in memory.
+    It opens its own session (on a replica if there is a healthy one) given that a streamed response outlives the request dependencies
+    """
 
+    async with (replicas.pick() or AsyncSessionLocal)() as db:
 
+        result = await db.stream(stmt.execution_options(yield_per=batch_size))
 
+        async for rows in result.partitions(batch_size):
+            yield rows
@@ -0,0 +1,303 @@
+
+# 3RD PARTY IMPORTS
+from decouple import config
+from sqlalchemy import event
+from starlette.routing import Match
+
+# LOCAL IMPORTS
+...
+
+# BUILT-IN IMPORTS
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+import logging
+import re
+import threading
+import time
+
+
+
+
+# INSTRUMENTATION SETTINGS
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=200, cast=float)   # Statements slower than this are logged, 0 disables the log
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histograms buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+
+
+# SQL statements counter
+class QueryCounter:
+
+    """
+    Context manager that records every SQL statement sent through an engine while it is active
+    (pass 'async_engine.sync_engine' for the async one), used to catch N+1 regressions:
+
+        with QueryCounter(async_engine.sync_engine) as queries:
+            ...
+        queries.assert_at_most(1)
+    """
+
+    def __init__(self, engine):
+
+        self.engine = engine
+        self.statements: list[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def assert_at_most(self, expected: int, label: str = "") -> None:
+
+        # Query count guard, the message lists the statements so the extra ones are easy to spot
+        if self.count > expected:
+            listing = "\n".join(f"  {n}. {statement}" for n, statement in enumerate(self.statements, 1))
+            raise AssertionError(f"{label or 'Block'} issued {self.count} SQL statements, expected at most {expected}:\n{listing}")
+
+
+
+
+# SQL normalization (literals & placeholders folded) so the slow statements group by shape in the logs
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\$\d+|%\(\w+\)s|\b\d+(?:\.\d+)?\b")
+_SQL_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+
+def normalize_sql(statement: str) -> str:
+
+    """This function collapses the whitespace and replaces every literal / bound parameter of a statement with '?'"""
+
+    statement = _SQL_LITERALS.sub("?", " ".join(statement.split()))
+
+    return _SQL_LISTS.sub("(...)", statement)
+
+
+# DB work of the request being served
+class RequestStats:
+
+    __slots__ = ("request", "statements", "db_seconds", "slowest_seconds")
+
+    def __init__(self, request: str):
+
+        self.request = request   # 'METHOD /path', named in the slow query log
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.slowest_seconds = 0.0
+
+    def record(self, seconds: float) -> None:
+
+        self.statements += 1
+        self.db_seconds += seconds
+        self.slowest_seconds = max(self.slowest_seconds, seconds)
+
+    def server_timing(self, total_seconds: float) -> str:
+
+        return (f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} queries", '
+                f'db-slowest;dur={self.slowest_seconds * 1000:.2f}, '
+                f'app;dur={total_seconds * 1000:.2f}')
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+
+
+# PROMETHEUS METRICS
+class Metrics:
+
+    """
+    In-process counters & histograms rendered in the Prometheus text format (per worker process,
+    the scraper sums the workers)
+    """
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], list] = {}   # [bucket counts..., sum, count]
+        self._help: dict[str, tuple[str, str]] = {}
+
+    def describe(self, name: str, kind: str, help: str) -> None:
+        self._help[name] = (kind, help)
+
+    def inc(self, name: str, labels: dict, value: float = 1.0) -> None:
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: dict, value: float) -> None:
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0] * len(BUCKETS) + [0.0, 0])
+            index = bisect_left(BUCKETS, value)
+            if index < len(BUCKETS):
+                histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @staticmethod
+    def _labels(labels: tuple, extra: str = "") -> str:
+
+        pairs = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self, gauges: list[tuple[str, dict, float]] = ()) -> str:
+
+        """Text exposition of every metric, plus the point in time 'gauges' given as (name, labels, value)"""
+
+        lines = []
+        described = set()
+
+        def header(name: str, kind: str):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {self._help.get(name, (kind, name))[1]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(value)) for key, value in self._histograms.items())
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram):
+                cumulative += count
+                le = 'le="%g"' % bound
+                lines.append(f"{name}_bucket{self._labels(labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{self._labels(labels, le)} {histogram[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {histogram[-2]:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {histogram[-1]}")
+
+        for name, labels, value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{self._labels(tuple(sorted(labels.items())))} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("http_requests_total", "counter", "HTTP requests served")
+metrics.describe("http_request_duration_seconds", "histogram", "HTTP request latency")
+metrics.describe("http_request_db_statements_total", "counter", "SQL statements issued by the requests")
+metrics.describe("http_request_db_seconds_total", "counter", "Time the requests spent in SQL statements")
+metrics.describe("db_statement_duration_seconds", "histogram", "SQL statement latency")
+metrics.describe("db_slow_statements_total", "counter", "SQL statements slower than SLOW_QUERY_MS")
+
+
+
+
+# ENGINE LISTENERS
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+
+    # Attribute the statement to the request being served (none for the background tasks & scripts)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(elapsed)
+
+    metrics.observe("db_statement_duration_seconds", {}, elapsed)
+
+    # Slow query log
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        metrics.inc("db_slow_statements_total", {})
+        logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, stats.request if stats else "background task", normalize_sql(statement))
+
+
+# A failed statement never reaches 'after_cursor_execute', drop its start time
+def _handle_error(exception_context):
+
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+
+def instrument_engine(engine) -> None:
+
+    """This function times every statement of the engine (pass 'async_engine.sync_engine' for the async one)"""
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+
+
+# REQUEST MIDDLEWARE
+class QueryTimingMiddleware:
+
+    """
+    Pure ASGI middleware: collects the DB work of each request (statements, DB time, slowest statement time),
+    sends it to the client in a 'Server-Timing' header and feeds the per route metrics
+    """
+
+    def __init__(self, app):
+
+        self.app = app
+
+    # Route template of the request ('/posts/{id}'), keeps the metrics labels bounded
+    @staticmethod
+    def _route(scope) -> str:
+
+        for route in getattr(scope.get("app"), "routes", ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(f"{scope['method']} {scope['path']}")
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing(time.perf_counter() - start).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+
+        finally:
+            _request_stats.reset(token)
+
+            labels = {"method": scope["method"], "route": self._route(scope)}
+            metrics.inc("http_requests_total", {**labels, "status": status_code})
+            metrics.observe("http_request_duration_seconds", labels, time.perf_counter() - start)
+            metrics.inc("http_request_db_statements_total", labels, stats.statements)
+            metrics.inc("http_request_db_seconds_total", labels, stats.db_seconds)
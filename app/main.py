@@ -1,13 +1,17 @@
 
 # 3RD PARTY IMPORTS
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 # LOCAL IMPORTS
-from . import models, database
-from .routers import post, user, auth, vote
+from . import models, database, utils
+from .instrumentation import QueryTimingMiddleware, instrument_engine
+from .routers import post, user, auth, vote, admin
+from .ranking import score_refresher
+from .vote_queue import vote_queue
 
 # BUILT-IN IMPORTS
-...
+from contextlib import asynccontextmanager
 
 
 
@@ -16,12 +20,52 @@ from .routers import post, user, auth, vote
 # models.Base.metadata.create_all(bind=database.engine) # NO LONGER NEEDED GIVEN THAT ALEMBIC IS MANAGING THE TABLES CREATION-
 
 
-# Set up the server app
-app = FastAPI()
+# App lifespan: warm up what the requests need & flush the queued votes, release the pooled DB connections and the bcrypt processes on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+
+    # Make the login dummy hash up front instead of on the first unknown email
+    utils.dummy_hash()
+
+    # Start the bcrypt processes before the first login / sign up
+    utils.start_hash_pool()
+
+    # Start the votes flusher (write-behind mode) & the refresh of the ranked feeds scores
+    if vote_queue:
+        await vote_queue.start()
+    await score_refresher.start()
+
+    # First health check of the read replicas (if any) & their periodic checks
+    await database.replicas.start()
+
+    yield
+
+    await database.replicas.stop()
+
+    await score_refresher.stop()
+
+    # Write the queued votes before the connections go away
+    if vote_queue:
+        await vote_queue.stop()
+
+    await database.async_engine.dispose()
+    utils.shutdown_hash_pool()
+
+
+# Time every SQL statement, the middleware attributes them to the request being served
+instrument_engine(database.async_engine.sync_engine)
+instrument_engine(database.engine)
+for replica_engine in database.replicas.engines:
+    instrument_engine(replica_engine.sync_engine)
+
+# Set up the server app (orjson renders every response body, the DB work of each request goes to its 'Server-Timing' header & the metrics)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(QueryTimingMiddleware)
 app.include_router(post.router)
 app.include_router(user.router)
 app.include_router(auth.router)
 app.include_router(vote.router)
+app.include_router(admin.router)
 
 
 
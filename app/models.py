@@ -1,6 +1,7 @@
 # 3RD PARTY IMPORTS
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, Float, Index, Integer, String, Boolean, ForeignKey
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from sqlalchemy.sql import func
 
@@ -14,17 +15,50 @@ from .database import Base
 class Post(Base):
 
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),   # Feed ordering & keyset seek
+        Index("ix_posts_search_vector", "search_vector", postgresql_using = "gin"),
+        Index("ix_posts_title_trgm", "title", postgresql_using = "gin", postgresql_ops = {"title": "gin_trgm_ops"}),
+        Index("ix_posts_content_trgm", "content", postgresql_using = "gin", postgresql_ops = {"content": "gin_trgm_ops"}),
+    )
 
     id = Column(Integer, primary_key = True, nullable = False)
     title = Column(String, nullable = False)
     content = Column(String, nullable = False)
     published = Column(Boolean, nullable = False, server_default = 'True')
     created_at = Column(TIMESTAMP(timezone = True), nullable = False, server_default = func.now())
-    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE", onupdate="CASCADE"), nullable = False)
+    updated_at = Column(TIMESTAMP(timezone = True), nullable = False, server_default = func.now())   # Set by the post edits, part of the ETag
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE", onupdate="CASCADE"), nullable = False, index = True)
+    vote_count = Column(Integer, nullable = False, server_default = '0')   # Kept exact by the 'votes_count_*' DB triggers
+    search_vector = deferred(Column(TSVECTOR, Computed("setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', content), 'B')", persisted = True)))   # Only read by the full text search filter
     
     owner = relationship("User")
 
 
+# Post Scores DB Model Setting (ranked feeds, precomputed by 'app.ranking')
+class PostScore(Base):
+
+    __tablename__ = "post_scores"
+    __table_args__ = (
+        Index("ix_post_scores_hot", "hot", "post_id"),   # 'hot' ordering & keyset seek (scanned backwards)
+        Index("ix_post_scores_top", "top", "post_id"),   # 'top' ordering & keyset seek (scanned backwards)
+    )
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE", onupdate="CASCADE"), primary_key = True, nullable = False)
+    hot = Column(Float, nullable = False)
+    top = Column(Integer, nullable = False)   # The 'posts.vote_count' the scores were computed from
+    refreshed_at = Column(TIMESTAMP(timezone = True), nullable = False, server_default = func.now())
+
+
+# Post Score Queue DB Model Setting (posts due for a scores refresh, queued by DB triggers on the new posts & the votes)
+class PostScoreQueue(Base):
+
+    __tablename__ = "post_score_queue"
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE", onupdate="CASCADE"), primary_key = True, nullable = False)
+    queued_at = Column(TIMESTAMP(timezone = True), nullable = False, server_default = func.now())
+
+
 # Users DB Model Setting
 class User(Base):
 
@@ -34,6 +68,8 @@ class User(Base):
     email = Column(String, nullable = False, unique = True)
     password = Column(String, nullable = False)
     created_at = Column(TIMESTAMP(timezone=True), nullable = False, server_default = func.now())
+    updated_at = Column(TIMESTAMP(timezone=True), nullable = False, server_default = func.now())   # Set by the user edits, part of the ETag
+    token_version = Column(Integer, nullable = False, server_default = '0')   # Bumped to revoke the tokens issued before
 
 
 # Votes DB Model Setting
@@ -42,7 +78,7 @@ class Vote(Base):
     __tablename__ = "votes"
 
     post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE", onupdate="CASCADE"), primary_key = True, nullable = False)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE", onupdate="CASCADE"), primary_key = True, nullable = False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE", onupdate="CASCADE"), primary_key = True, nullable = False, index = True)
     
     
     
@@ -1,18 +1,22 @@
 
 # 3RD PARTY IMPORTS
 from jose import JWTError, jwt
-from fastapi import Depends, status, HTTPException
+from fastapi import Depends, Request, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-
+from sqlalchemy import select
 
 # LOCAL IMPORTS
-from app import schemas, models
-from app.database import get_db
+from app import schemas
 
 # BUILT-IN IMPORTS
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from decouple import config
+from decouple import config, Csv
+from typing import Optional
+import hashlib
+import secrets
+import threading
+import time
 
 
 
@@ -21,6 +25,128 @@ SECRET_KEY = config('SECRET_KEY')
 ALGORITHM = config('ALGORITHM')
 ACCESS_TOKE_EXPIRE_MINUTES = int(config('ACCESS_TOKE_EXPIRE_MINUTES'))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login')
+TOKEN_CACHE_SIZE = config('TOKEN_CACHE_SIZE', default=10000, cast=int)
+TOKEN_VERSION_TTL = config('TOKEN_VERSION_TTL', default=10, cast=float)     # Seconds a user's token version is trusted before it is read again
+ADMIN_USER_IDS = config('ADMIN_USER_IDS', default='', cast=Csv(int))   # Users allowed on the '/admin' endpoints
+METRICS_TOKEN = config('METRICS_TOKEN', default='')                     # Bearer token of the metrics scraper ('' disables it)
+
+
+
+
+# Verified tokens cache
+class TokenCache:
+
+    """
+    Bounded LRU of the already verified tokens keyed on their SHA-256 digest, each entry lives until the token's own 'exp'.
+    A lock guards the entries so it stays safe when called from the threadpool workers serving sync code
+    """
+
+    def __init__(self, maxsize: int):
+
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, tuple[schemas.TokenData, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str):
+
+        key = hashlib.sha256(token.encode()).digest()
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+
+            # Unknown or expired token, the caller has to verify it
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, token_data: schemas.TokenData, expires_at: float) -> None:
+
+        if self.maxsize <= 0:
+            return
+
+        key = hashlib.sha256(token.encode()).digest()
+
+        with self._lock:
+
+            self._entries[key] = (token_data, expires_at)
+            self._entries.move_to_end(key)
+
+            # Drop the least recently used tokens over the bound
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+
+# Current token versions cache
+class TokenVersions:
+
+    """
+    Bounded LRU of the users' current 'token_version', each entry trusted for 'ttl' seconds. A revocation (version bump)
+    reaches the other workers within 'ttl', the worker that made it forgets its entry right away
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[int]:
+
+        with self._lock:
+
+            entry = self._entries.get(user_id)
+
+            # Unknown or stale version, the caller has to read it
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(user_id, None)
+                return None
+
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def put(self, user_id: int, version: int) -> None:
+
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+
+        with self._lock:
+
+            self._entries[user_id] = (version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+
+            # Drop the least recently used users over the bound
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id: int) -> None:
+
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+token_versions = TokenVersions(TOKEN_CACHE_SIZE, TOKEN_VERSION_TTL)
 
 
 
@@ -47,6 +173,11 @@ def create_access_token(data: dict):
 # Token validation function
 def verify_access_token(token: str, credentials_exception):
 
+    # Skip the signature verification if this exact token was already verified and hasn't expired
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
     try: 
 
         # Decode the passed token
@@ -59,70 +190,87 @@ def verify_access_token(token: str, credentials_exception):
         if not id:
             raise credentials_exception
         
-        # Token data validated
-        token_data = schemas.TokenData(id=id)
+        # Token data validated (tokens issued before the version claim existed are version 0)
+        token_data = schemas.TokenData(id=id, token_version=payload.get("ver", 0))
 
     except JWTError as e:
         print(e)
         raise credentials_exception
     
+    # Remember the verified token until its own expiration
+    if payload.get("exp"):
+        token_cache.put(token, token_data, float(payload["exp"]))
+
     # Return the token data
     return token_data
 
 
-# Actually User Authentication Function
-def get_current_user(token:str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-
-    # Set the type of exception to be passed if the token validation fails
-    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
-                                          detail=f"Could not validate credentials",
-                                            headers={'WWW-Authenticate': "Bearer"} )
-    
-    # Store the response of the token verification
-    validated_token = verify_access_token(token=token, credentials_exception=credentials_exception)
-
-    # Call the actual user from the DB
-    user = db.query(models.User).where(models.User.id == validated_token.id).first()
-
-    # Return the actual authenticated User
-    return user
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# Current token version of a user (-1 once the user is gone, no token carries it), read from the DB at most once per TOKEN_VERSION_TTL
+async def current_token_version(user_id: int) -> int:
 
+    version = token_versions.get(user_id)
+    if version is not None:
+        return version
 
+    # Imported here, the DB module depends on this one for the principal of its read sessions
+    from app import models
+    from app.database import AsyncSessionLocal
 
+    async with AsyncSessionLocal() as db:
+        version = (await db.execute(select(models.User.token_version).filter(models.User.id == user_id))).scalar()
 
+    version = -1 if version is None else version
+    token_versions.put(user_id, version)
 
+    return version
 
 
+# Actually User Authentication Function
+async def get_current_user(request: Request, token:str = Depends(oauth2_scheme)) -> schemas.TokenData:
 
+    """
+    Principal built from the verified JWT claims (id & token version), checked against the user's current token version
+    (cached, so a DB round-trip only happens once per TOKEN_VERSION_TTL). This is the default dependency given that most
+    of the path operations only need 'current_user.id'.
+    The principal is also left on 'request.state' for the session teardown (read-your-writes)
+    """
 
+    # Set the type of exception to be passed if the token validation fails
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
+                                          detail=f"Could not validate credentials",
+                                            headers={'WWW-Authenticate': "Bearer"} )
+    
+    # Validate the token
+    principal = verify_access_token(token=token, credentials_exception=credentials_exception)
 
+    # Revocation guard (bumping 'users.token_version' invalidates every token issued before, deleting the user all of them)
+    if await current_token_version(principal.id) != principal.token_version:
+        raise credentials_exception
 
+    # Return the validated token data as the authenticated principal
+    request.state.principal = principal
+    return principal
 
 
+# Administrator Authentication Function
+async def get_current_admin(current_user: schemas.TokenData = Depends(get_current_user)) -> schemas.TokenData:
 
+    # Only the users listed in ADMIN_USER_IDS pass (none by default)
+    if current_user.id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail=f"Only the administrators can access this resource!")
 
+    # Return the authenticated administrator
+    return current_user
 
 
+# Metrics Scraper Authentication Function
+async def get_metrics_scraper(request: Request, token:str = Depends(oauth2_scheme)):
 
+    # The scraper presents METRICS_TOKEN as a static bearer token (compared in constant time)
+    if METRICS_TOKEN and secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return None
 
+    # Otherwise it has to be an administrator's access token
+    return await get_current_admin(await get_current_user(request, token))
 
@@ -0,0 +1,154 @@
+
+# 3RD PARTY IMPORTS
+from decouple import config
+from sqlalchemy import Float, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# LOCAL IMPORTS
+from app import models
+from app.cache import post_cache
+from app.database import AsyncSessionLocal, async_engine
+
+# BUILT-IN IMPORTS
+from typing import Optional
+import argparse
+import asyncio
+import logging
+
+
+
+
+# RANKING SETTINGS
+SCORE_REFRESH_INTERVAL = config('SCORE_REFRESH_INTERVAL', default=5.0, cast=float)   # Seconds, 0 disables the background refresh
+SCORE_REFRESH_BATCH = config('SCORE_REFRESH_BATCH', default=5000, cast=int)
+HOT_DECAY_SECONDS = config('HOT_DECAY_SECONDS', default=45000, cast=int)             # Age a post makes up for with 10x the votes
+
+logger = logging.getLogger(__name__)
+
+
+
+
+# 'hot' score: log10 of the votes plus the creation time, a post needs 10x the votes to outrank one
+# HOT_DECAY_SECONDS newer. It only changes with the votes, so only the voted posts need a refresh
+def hot_score(vote_count, created_at):
+
+    return cast(func.log(func.greatest(vote_count, 1)) + func.extract("epoch", created_at) / HOT_DECAY_SECONDS, Float)
+
+
+# Scores refresh
+async def refresh_scores(db: AsyncSession, batch_size: int = SCORE_REFRESH_BATCH) -> int:
+
+    """
+    This function (re)computes the scores of the queued posts (new or voted since their last refresh, see 'post_score_queue'),
+    draining 'batch_size' of them per transaction. Returns the number of posts refreshed
+    """
+
+    refreshed = 0
+
+    while True:
+
+        # Claim a batch of the queue, the posts claimed by a concurrent refresh (another worker) are skipped
+        queued = select(models.PostScoreQueue.post_id)\
+            .order_by(models.PostScoreQueue.post_id)\
+            .limit(batch_size)\
+            .with_for_update(skip_locked=True)
+        claimed = delete(models.PostScoreQueue)\
+            .filter(models.PostScoreQueue.post_id.in_(queued))\
+            .returning(models.PostScoreQueue.post_id)\
+            .cte("claimed")
+
+        # Scores of the claimed posts from their current vote count (a vote committed meanwhile queues its post again)
+        scores = select(models.Post.id, hot_score(models.Post.vote_count, models.Post.created_at), models.Post.vote_count, func.now())\
+            .join(claimed, claimed.c.post_id == models.Post.id)
+
+        upsert = insert(models.PostScore).from_select(["post_id", "hot", "top", "refreshed_at"], scores)
+        upsert = upsert.on_conflict_do_update(index_elements=[models.PostScore.post_id],
+                                              set_={"hot": upsert.excluded.hot, "top": upsert.excluded.top,
+                                                    "refreshed_at": upsert.excluded.refreshed_at})
+
+        # Execute the claim & upsert in one statement & commit the batch
+        count = (await db.execute(upsert)).rowcount
+        await db.commit()
+
+        refreshed += count
+
+        if count < batch_size:
+            return refreshed
+
+
+# Queue every post (e.g. after HOT_DECAY_SECONDS changed), the next refresh recomputes all the scores
+async def queue_all_scores(db: AsyncSession) -> None:
+
+    await db.execute(insert(models.PostScoreQueue).from_select(["post_id"], select(models.Post.id)).on_conflict_do_nothing())
+    await db.commit()
+
+
+# BACKGROUND REFRESH
+class ScoreRefresher:
+
+    """
+    Refreshes the queued scores every 'interval' seconds while the app runs, an idle tick costs one empty index read.
+    Every worker runs one and they split the queue (set SCORE_REFRESH_INTERVAL=0 and run 'python -m app.ranking' on a schedule instead)
+    """
+
+    def __init__(self, interval: float):
+
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+
+        while True:
+
+            try:
+                async with AsyncSessionLocal() as db:
+                    refreshed = await refresh_scores(db)
+
+                # The ranked pages cached so far may be in the old order
+                if refreshed and post_cache:
+                    await post_cache.invalidate_rankings()
+
+            except Exception:
+                logger.exception("Post scores refresh failed")
+
+            await asyncio.sleep(self.interval)
+
+
+score_refresher = ScoreRefresher(SCORE_REFRESH_INTERVAL)
+
+
+
+
+# Command line entry point: python -m app.ranking [--batch-size N] [--all]
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Refresh the precomputed post scores of the ranked feeds")
+    parser.add_argument("--batch-size", type=int, default=SCORE_REFRESH_BATCH)
+    parser.add_argument("--all", action="store_true", help="Recompute every post score, not only the queued ones")
+    args = parser.parse_args()
+
+    async def main() -> int:
+        async with AsyncSessionLocal() as db:
+            if args.all:
+                await queue_all_scores(db)
+            refreshed = await refresh_scores(db, batch_size=args.batch_size)
+        await async_engine.dispose()
+        return refreshed
+
+    print(f"Refreshed {asyncio.run(main())} post score(s)")
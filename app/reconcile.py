@@ -0,0 +1,69 @@
+
+# 3RD PARTY IMPORTS
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+# LOCAL IMPORTS
+from app import models
+from app.database import SessionLocal
+
+# BUILT-IN IMPORTS
+import argparse
+
+
+
+
+# Vote counters reconciliation
+def reconcile_vote_counts(db: Session, batch_size: int = 10000) -> int:
+
+    """
+    This function recomputes 'posts.vote_count' from the 'votes' table and fixes the counters that drifted,
+    it walks the posts in id ranges of 'batch_size' committing each range so no long lock is held on the table.
+    Returns the number of posts whose counter was corrected
+    """
+
+    # Get the highest post id to know where to stop
+    max_id = db.execute(select(func.max(models.Post.id))).scalar() or 0
+
+    fixed = 0
+
+    for lower in range(0, max_id + 1, batch_size):
+
+        upper = lower + batch_size
+
+        # Actual votes per post in the range
+        counts = select(models.Post.id.label("post_id"), func.count(models.Vote.post_id).label("n"))\
+            .join(models.Vote, models.Vote.post_id == models.Post.id, isouter=True)\
+            .filter(models.Post.id >= lower, models.Post.id < upper)\
+            .group_by(models.Post.id)\
+            .subquery()
+
+        # Only rewrite the counters that differ from the actual count
+        stmt = update(models.Post)\
+            .where(models.Post.id == counts.c.post_id, models.Post.vote_count != counts.c.n)\
+            .values(vote_count=counts.c.n)\
+            .execution_options(synchronize_session=False)
+
+        # Execute the update & commit the range
+        fixed += db.execute(stmt).rowcount
+        db.commit()
+
+    return fixed
+
+
+
+
+# Command line entry point: python -m app.reconcile [--batch-size N]
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Recompute drifted 'posts.vote_count' counters")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+
+    try:
+        print(f"Reconciled {reconcile_vote_counts(db, batch_size=args.batch_size)} post(s)")
+
+    finally:
+        db.close()
@@ -0,0 +1,74 @@
+
+# 3RD PARTY IMPORTS
+from fastapi import status, Depends, APIRouter
+from fastapi.responses import PlainTextResponse
+
+# LOCAL IMPORTS
+from app import oauth2, database
+from app.instrumentation import metrics
+from app.cache import post_cache
+from app.vote_queue import vote_queue
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+# Create a Router for the app
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+
+
+# CONNECTION POOL METRICS
+@router.get("/pool", status_code=status.HTTP_200_OK)
+async def get_pool_metrics(current_user = Depends(oauth2.get_current_admin)):
+
+    # Return the live counters of every engine pool, used to size the workers against the DB connection limit
+    return [database.async_pool_metrics.snapshot(), database.pool_metrics.snapshot()] + database.replicas.stats()
+
+# READ REPLICAS HEALTH
+@router.get("/replicas", status_code=status.HTTP_200_OK)
+async def get_replicas(current_user = Depends(oauth2.get_current_admin)):
+
+    # Return the health, replay lag & pool counters of every read replica
+    return database.replicas.stats()
+
+# VERIFIED TOKENS CACHE METRICS
+@router.get("/token-cache", status_code=status.HTTP_200_OK)
+async def get_token_cache_metrics(current_user = Depends(oauth2.get_current_admin)):
+
+    # Return the hit / miss / eviction counters of the verified tokens cache
+    return oauth2.token_cache.stats()
+
+# POST READS CACHE METRICS
+@router.get("/cache", status_code=status.HTTP_200_OK)
+async def get_cache_metrics(current_user = Depends(oauth2.get_current_admin)):
+
+    # Return the hit ratio & memory footprint of the post reads cache
+    return await post_cache.stats() if post_cache else {"backend": None}
+
+# VOTES WRITE-BEHIND QUEUE METRICS
+@router.get("/vote-queue", status_code=status.HTTP_200_OK)
+async def get_vote_queue_metrics(current_user = Depends(oauth2.get_current_admin)):
+
+    # Return the queue depth & flush latency of the votes write-behind queue
+    return vote_queue.stats() if vote_queue else {"running": False}
+
+# PROMETHEUS METRICS
+@router.get("/metrics", status_code=status.HTTP_200_OK, response_class=PlainTextResponse)
+async def get_metrics(current_user = Depends(oauth2.get_metrics_scraper)):
+
+    # Point in time gauges: connection pools, read replicas health & votes queue depth
+    gauges = []
+    for snapshot in [database.async_pool_metrics.snapshot(), database.pool_metrics.snapshot()] + database.replicas.stats():
+        gauges += [(f"db_pool_{field}", {"engine": snapshot["engine"]}, value) for field, value in snapshot.items()
+                   if isinstance(value, (int, float)) and not isinstance(value, bool)]
+    for replica in database.replicas.stats():
+        gauges.append(("db_replica_healthy", {"engine": replica["engine"]}, int(replica["healthy"])))
+    if vote_queue:
+        gauges.append(("vote_queue_depth", {}, vote_queue.stats()["depth"]))
+
+    # Return the request, SQL & pool metrics in the Prometheus text format
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
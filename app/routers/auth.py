@@ -2,11 +2,12 @@
 # 3RD PARTY IMPORTS
 from fastapi import APIRouter, status, HTTPException, Depends
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # LOCAL IMPORTS
 from app import schemas, utils, models, oauth2
-from app.database import get_db
+from app.database import get_async_db
 
 
 # BUILT-IN IMPORTS
@@ -23,24 +24,38 @@ router = APIRouter(tags=["Authentication"])
 
 # LOGIN PATH OP
 @router.post('/login', status_code=status.HTTP_202_ACCEPTED, response_model=schemas.Token)
-def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     
-    # Build the DB query
-    user_query = db.query(models.User).filter(models.User.email == user_credentials.username)
+    # Build the DB query (one indexed lookup on the unique email, loading only what the login needs)
+    user_query = select(models.User.id, models.User.password, models.User.token_version)\
+        .filter(models.User.email == user_credentials.username)
 
-    # User existence validation query execution guard
-    if not user_query.first():
+    # Get the actual user, if any
+    user = (await db.execute(user_query)).first()
+
+    # User existence validation guard, the password is still checked against a dummy hash so
+    # unknown emails take as long as known ones and the timing doesn't leak which emails exist
+    if not user:
+        await utils.compare_pwds_async(user_credentials.password, utils.dummy_hash())
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid Credentials!") 
 
-    # Get the actual authorized user
-    user = user_query.first()
+    # Verify the password on the bcrypt process pool (it also rehashes it if it was made with an outdated cost)
+    valid, new_hash = await utils.verify_and_update_async(user_credentials.password, user.password)
 
     # Password validation guard
-    if not utils.compare_pwds(user_credentials.password, user.password):
+    if not valid:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid Credentials!") 
+
+    # Transparently store the upgraded hash
+    if new_hash:
+        await db.execute(update(models.User).filter(models.User.id == user.id).values(password=new_hash))
+        await db.commit()
     
+    # The version just read is current, the first requests with the token don't read it again
+    oauth2.token_versions.put(user.id, user.token_version)
+
     # Create the token
-    access_token = oauth2.create_access_token(data= {"user_id": user.id})
+    access_token = oauth2.create_access_token(data= {"user_id": user.id, "ver": user.token_version})
 
     # Return the token according to the response_model schema
     return {"access_token": access_token, "token_type": "bearer"}
@@ -1,15 +1,20 @@
 
 # 3RD PARTY IMPORTS
-from fastapi import status, HTTPException, Depends, APIRouter
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from fastapi import status, HTTPException, Depends, APIRouter, Header, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, delete, exists, false, func, insert, literal_column, or_, select, true, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from pydantic import ValidationError
 
 # LOCAL IMPORTS
-from app import schemas, models, oauth2
-from app.database import get_db
+from app import schemas, models, oauth2, utils
+from app.cache import post_cache
+from app.database import get_async_db, get_read_db, stream_rows
 
 # BUILT-IN IMPORTS
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Literal, Optional, Union
 
 
 
@@ -17,35 +22,244 @@ from typing import List, Optional
 # Create a Router for the app
 router = APIRouter(prefix="/posts", tags=["Post"])
 
+# Owner loading strategy of every post returned: joined in the same SELECT (no query per post, lazy loads
+# can't run under the async session anyway) and limited to the columns 'UserResponse' serializes
+OWNER_LOAD = joinedload(models.Post.owner).load_only(models.User.id, models.User.created_at)
+
+# Columns of the feed, read as plain row tuples and serialized straight to JSON (no ORM objects, no Pydantic)
+FEED_COLUMNS = (models.Post.id, models.Post.title, models.Post.content, models.Post.published, models.Post.created_at,
+                models.Post.updated_at, models.Post.owner_id, models.Post.vote_count.label("votes"),
+                models.User.created_at.label("owner_created_at"))
+
+# Columns of a post returned by the writes (RETURNING), the owner's are joined to them
+POST_COLUMNS = (models.Post.id, models.Post.title, models.Post.content, models.Post.published, models.Post.created_at,
+                models.Post.updated_at, models.Post.owner_id, models.Post.vote_count)
+
+# Post reads are private to the authenticated user and revalidated with their ETag on every use
+POSTS_CACHE_CONTROL = "private, max-age=0, must-revalidate"
+
+
+
+
+# Failure path of the ownership-scoped writes: missing post (404), someone else's (403) or failed If-Match precondition (412)
+async def ownership_failure(db: AsyncSession, id: int, owner_id: int) -> HTTPException:
+
+    post = (await db.execute(select(models.Post.owner_id).filter(models.Post.id == id))).first()
+
+    if not post:
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id '{id}' doesn't exist!")
+
+    if post.owner_id != owner_id:
+        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Unauthorized! Only the owner of the post can alter it!")
+
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=f"Post with id '{id}' was modified since it was read!")
+
+
+# If-Match precondition of a post write: the post must still be in (one of) the versions the client read
+def if_match_filter(if_match: Optional[str], id: int):
+
+    if not if_match or if_match.strip() == "*":
+        return true()
+
+    versions = [(updated_at, votes) for post_id, updated_at, votes in utils.parse_if_match(if_match, "p") if post_id == id]
+
+    return or_(false(), *(and_(models.Post.updated_at == updated_at, models.Post.vote_count == votes) for updated_at, votes in versions))
+
+
+# Ownership-scoped update of a post, read back along with its owner in a single statement (None if nothing matched)
+async def update_owned_post(db: AsyncSession, id: int, owner_id: int, values: dict, precondition):
+
+    # The update marker feeds the ETag & Last-Modified of the post
+    updated = update(models.Post)\
+        .filter(models.Post.id == id, models.Post.owner_id == owner_id, precondition)\
+        .values(**values, updated_at=func.now())\
+        .returning(*POST_COLUMNS)\
+        .cte("updated")
+
+    return (await db.execute(select(updated, models.User.created_at.label("owner_created_at"))
+                             .join(models.User, models.User.id == updated.c.owner_id))).first()
+
+
+# Feed query: the posts columns + owner's (+ 'voted_by_me' flag, + 'score' of the ranked sorts), filtered and ordered
+# by the sort keyset, resumed right after the 'after' (key, id) keyset if given
+def feed_query(user_id: int, search: Optional[str] = "", search_mode: str = "substring", sort: str = "new",
+               voted_by_me: bool = False, owner_only: bool = False, after: Optional[tuple] = None):
+
+    posts_query = select(*FEED_COLUMNS)\
+        .join(models.User, models.User.id == models.Post.owner_id)
+
+    # Whether the current user voted each post, a correlated EXISTS on the votes primary key in the same query
+    if voted_by_me:
+        posts_query = posts_query.add_columns(
+            exists().where(models.Vote.post_id == models.Post.id, models.Vote.user_id == user_id).label("voted_by_me"))
+
+    # Only the current user's posts
+    if owner_only:
+        posts_query = posts_query.filter(models.Post.owner_id == user_id)
+
+    # Full text search: matches the words on title & content through the GIN index, best ranked first
+    if search and search_mode == "fulltext":
+
+        # The config goes in as an SQL literal, bound as a parameter it's a VARCHAR that no websearch_to_tsquery signature takes
+        ts_query = func.websearch_to_tsquery(literal_column("'english'"), search)
+        posts_query = posts_query\
+            .filter(models.Post.search_vector.op("@@")(ts_query))\
+            .order_by(func.ts_rank(models.Post.search_vector, ts_query).desc())
+
+    # Substring search: case insensitive match on title or content, served by the trigram indexes
+    elif search:
+        pattern = utils.like_pattern(search)
+        posts_query = posts_query.filter(or_(models.Post.title.ilike(pattern, escape="\\"),
+                                             models.Post.content.ilike(pattern, escape="\\")))
+
+    # Ranked feeds: highest precomputed score first, read through the score indexes (posts are ranked from the next scores refresh on)
+    if sort != "new":
+        score = models.PostScore.hot if sort == "hot" else models.PostScore.top
+        posts_query = posts_query\
+            .join(models.PostScore, models.PostScore.post_id == models.Post.id)\
+            .add_columns(score.label("score"))
+        keyset = (score, models.PostScore.post_id)
+
+    # Newest first, the id breaks ties between posts created at the same time
+    else:
+        keyset = (models.Post.created_at, models.Post.id)
+
+    posts_query = posts_query.order_by(keyset[0].desc(), keyset[1].desc())
+
+    # Keyset seek past the last post served
+    if after is not None:
+        posts_query = posts_query.filter(tuple_(*keyset) < tuple_(*after))
+
+    return posts_query
+
+
+# Conditional response builder: 304 (no body) if the client's copy is still fresh, the payload otherwise
+def conditional_response(headers: dict, payload: Optional[bytes], if_none_match: Optional[str]) -> Response:
+
+    headers = {**headers, "Cache-Control": POSTS_CACHE_CONTROL}
+
+    if utils.etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+
+# Validators of a set of posts: ETag & Last-Modified (the latest edit)
+def validators(etag: str, last_modified: Optional[datetime]) -> dict:
+
+    headers = {"ETag": etag}
+
+    if last_modified:
+        headers["Last-Modified"] = utils.http_date(last_modified)
+
+    return headers
+
+
+# Post row (post columns + 'owner_created_at') to 'PostResponse' shaped dict
+def post_item(row) -> dict:
+
+    return {"title": row.title, "content": row.content, "published": row.published, "id": row.id,
+            "owner_id": row.owner_id, "created_at": row.created_at,
+            "owner": {"id": row.owner_id, "created_at": row.owner_created_at}}
+
+
+# Feed row to 'PostVoteResponse' shaped dict ('PostVoteFlagResponse' when the row carries the 'voted_by_me' flag)
+def feed_item(row) -> dict:
+
+    item = {"Post": post_item(row), "votes": row.votes}
+
+    if "voted_by_me" in row._fields:
+        item["voted_by_me"] = row.voted_by_me
+
+    return item
+
 
 
 
 # GET ALL POSTS
-@router.get("/", response_model=List[schemas.PostVoteResponse])
-def get_posts(db: Session = Depends(get_db), current_user = Depends(oauth2.get_current_user),
-              limit: int = 10, skip: int = 0, search: Optional[str] = ""):
+@router.get("/", response_model=Union[List[schemas.PostVoteResponse], List[schemas.PostVoteFlagResponse], schemas.PostPage])
+async def get_posts(db: AsyncSession = Depends(get_read_db), current_user = Depends(oauth2.get_current_user),
+                    limit: int = 10, skip: int = 0, search: Optional[str] = "",
+                    search_mode: Literal["substring", "fulltext"] = "substring",
+                    pagination: Literal["offset", "cursor"] = "offset", cursor: Optional[str] = None,
+                    sort: Literal["new", "hot", "top"] = "new", voted_by_me: bool = False, owner_only: bool = False,
+                    if_none_match: Optional[str] = Header(None)):
+
+    # Full text search guards
+    if search and search_mode == "fulltext":
+
+        # Ranking guard (a rank can't be resumed from a (created_at, id) cursor)
+        if pagination == "cursor" or cursor is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Full text search results can only be paged with 'skip'!")
+
+        # Ordering guard (the results are ordered by relevance)
+        if sort != "new":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Full text search results can't be sorted by '{sort}'!")
+
+    # Offset mode (kept for compatibility with the clients paging with 'skip') or cursor mode
+    cursor_mode = pagination == "cursor" or cursor is not None
+
+    # Cursor mode: seek past the last post served instead of scanning and discarding 'skip' rows
+    after = None
+    if cursor:
+
+        # Cursor validation guard
+        try:
+            after = utils.decode_cursor(cursor, sort)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor!")
 
     # Posts query setting
-    posts_query = db.query(models.Post, func.count(models.Vote.post_id).label("votes"))\
-        .join(models.Vote, models.Vote.post_id == models.Post.id, isouter=True)\
-        .group_by(models.Post.id)\
-        .filter(models.Post.title.contains(search))\
-        .limit(limit)\
-        .offset(skip)
-    
-    # Execute the Posts query
-    posts = posts_query.all()
-
-    # Convert each SQLAlchemy model to a dictionary using Pydantic
-    result = [{"Post": schemas.PostResponse.model_validate(post), "votes": votes} for post, votes in posts]
-  
-    # Return all posts found in the DB as a list of dicts
-    return result
+    posts_query = feed_query(current_user.id, search=search, search_mode=search_mode, sort=sort,
+                             voted_by_me=voted_by_me, owner_only=owner_only, after=after)
+
+    # Serve the page from the cache if it was already computed (not to a recent writer, who reads its writes from the primary)
+    if post_cache:
+        cache_key = await post_cache.feed_key(limit=limit, skip=None if cursor_mode else skip, search=search,
+                                              search_mode=search_mode, cursor_mode=cursor_mode, cursor=cursor, sort=sort,
+                                              voted_by_me=voted_by_me, owner_only=owner_only,
+                                              user=current_user.id if voted_by_me or owner_only else None)
+        cached = None if db.info["recent_writer"] else await post_cache.get_feed(cache_key)
+        if cached is not None:
+            return conditional_response(*cached, if_none_match)
+
+    # Execute the Posts query (fetching one extra row in cursor mode to know if there is a next page)
+    if not cursor_mode:
+        page = (await db.execute(posts_query.limit(limit).offset(skip))).all()
+    else:
+        posts = (await db.execute(posts_query.limit(limit + 1))).all()
+        page = posts[:limit]
+
+    # Build the cursor pointing right after the last post of the page
+    next_cursor = None
+    if cursor_mode and len(posts) > limit and page:
+        next_cursor = utils.encode_cursor(page[-1].score if sort != "new" else page[-1].created_at, page[-1].id, sort)
+
+    # Freshness check straight from the rows: the client's copy is still valid, skip the serialization
+    item_etags = [utils.post_etag(row.id, row.updated_at, row.votes) for row in page]
+    if voted_by_me:
+        item_etags = [f"{etag}:{row.voted_by_me:d}" for etag, row in zip(item_etags, page)]
+    headers = validators(utils.feed_etag(item_etags, next_cursor),
+                         max((row.updated_at for row in page), default=None))
+    if utils.etag_matches(if_none_match, headers["ETag"]):
+        return conditional_response(headers, None, if_none_match)
+
+    # Serialize the list of posts, or the page of posts along with its next cursor, in a single pass over the rows
+    items = [feed_item(row) for row in page]
+    payload = utils.json_bytes(items if not cursor_mode else {"items": items, "next_cursor": next_cursor})
+
+    # Keep the serialized page for the next requests, tagged with the posts it shows (a replica read is only kept once the
+    # replicas caught up with the last invalidation)
+    if post_cache:
+        await post_cache.set_feed(cache_key, headers, payload, [row.id for row in page], replica=db.info["replica"])
+
+    # Return the posts found in the DB
+    return conditional_response(headers, payload, if_none_match)
 
 # CREATE ONE POST
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.PostResponse)
-def create_post(post: schemas.PostCreate, db: Session = Depends(get_db), current_user = Depends(oauth2.get_current_user)):
-    
+async def create_post(post: schemas.PostCreate, db: AsyncSession = Depends(get_async_db), current_user = Depends(oauth2.get_current_user)):
+
     # Create a new post with the passed info in the Endpoint according to the model defined for Posts
     new_post = models.Post(owner_id = current_user.id, **post.model_dump()) # The post unpacking (**) is doing the same as "title = post.title, content = post.content ..."
 
@@ -53,83 +267,179 @@ def create_post(post: schemas.PostCreate, db: Session = Depends(get_db), current
     db.add(new_post)
 
     # Commit the change to the DB
-    db.commit()
+    await db.commit()
 
-    # Update the post how it was created in the DB
-    db.refresh(new_post)
+    # The feed pages cached so far don't show the new post
+    if post_cache:
+        await post_cache.invalidate_feeds()
+
+    # Read the post back how it was created in the DB, along with its owner
+    new_post = (await db.execute(select(models.Post).options(OWNER_LOAD).filter(models.Post.id == new_post.id))).scalar_one()
 
     # Return the newly created post back to the Client
     return new_post
 
+# CREATE MANY POSTS
+@router.post("/bulk", status_code=status.HTTP_200_OK, response_model=schemas.PostBulkResponse)
+async def create_posts(bulk: schemas.PostBulk, db: AsyncSession = Depends(get_async_db), current_user = Depends(oauth2.get_current_user)):
+
+    # Validate every item in one pass, the invalid ones are reported and left out of the insert
+    rows, results = [], []
+    for index, item in enumerate(bulk.items):
+        try:
+            rows.append((index, {"owner_id": current_user.id, **schemas.PostCreate.model_validate(item).model_dump()}))
+        except ValidationError as e:
+            results.append({"index": index, "status": "invalid",
+                            "errors": [{"loc": error["loc"], "msg": error["msg"], "type": error["type"]} for error in e.errors()]})
+
+    if rows:
+
+        # Insert the valid posts with a single multi-row INSERT ... RETURNING, read back along with their owner
+        # (the ids follow the VALUES order, ordering by id maps each post back to its item)
+        created = insert(models.Post).values([row for _, row in rows]).returning(*POST_COLUMNS).cte("created")
+        new_posts = (await db.execute(select(created, models.User.created_at.label("owner_created_at"))
+                                      .join(models.User, models.User.id == created.c.owner_id)
+                                      .order_by(created.c.id))).all()
+
+        # Commit the change to the DB
+        await db.commit()
+
+        # The feed pages cached so far don't show the new posts
+        if post_cache:
+            await post_cache.invalidate_feeds()
+
+        results += [{"index": index, "status": "created", "post": post_item(post)} for (index, _), post in zip(rows, new_posts)]
+
+    # Return the outcome of every item, in the order they were sent
+    return {"results": sorted(results, key=lambda result: result["index"])}
+
+# EXPORT ALL POSTS (declared before "/{id}" so "export" isn't taken as an id)
+@router.get("/export", response_class=StreamingResponse)
+async def export_posts(current_user = Depends(oauth2.get_current_user)):
+
+    # Every post in id order, same columns & shape as the feed
+    export_query = select(*FEED_COLUMNS)\
+        .join(models.User, models.User.id == models.Post.owner_id)\
+        .order_by(models.Post.id)
+
+    # One JSON document per line, written batch by batch as the cursor advances
+    async def ndjson():
+        async for rows in stream_rows(export_query):
+            yield b"".join(utils.json_bytes(feed_item(row)) + b"\n" for row in rows)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 # GET ONE POST BY ID
 @router.get("/{id}", status_code=status.HTTP_200_OK, response_model=schemas.PostVoteResponse)
-def get_post(id: int, db: Session = Depends(get_db), current_user = Depends(oauth2.get_current_user)):
+async def get_post(id: int, db: AsyncSession = Depends(get_read_db), current_user = Depends(oauth2.get_current_user),
+                   if_none_match: Optional[str] = Header(None)):
+
+    # Serve the post from the cache if it was already computed (not to a recent writer, who reads its writes from the primary)
+    if post_cache:
+        cache_key = await post_cache.post_key(id)
+        cached = None if db.info["recent_writer"] else await post_cache.get_post(cache_key)
+        if cached is not None:
+            return conditional_response(*cached, if_none_match)
 
     # Create the post query matching the id passed in the URL
-    post_query = db.query(models.Post, func.count(models.Vote.post_id).label("votes"))\
-        .join(models.Vote, models.Vote.post_id == models.Post.id, isouter=True)\
-        .group_by(models.Post.id)\
+    post_query = select(models.Post, models.Post.vote_count.label("votes"))\
+        .options(OWNER_LOAD)\
         .filter(models.Post.id == id)
 
     # Get the post matched
-    post = post_query.first()
+    post = (await db.execute(post_query)).first()
 
     # Post look up guard (Actual query execution)
     if not post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id '{id}' was not found!")
-    
+
+    # Freshness check straight from the row: the client's copy is still valid, skip the serialization
+    headers = validators(utils.post_etag(post.Post.id, post.Post.updated_at, post.votes), post.Post.updated_at)
+    if utils.etag_matches(if_none_match, headers["ETag"]):
+        return conditional_response(headers, None, if_none_match)
+
+    # Serialize the post & keep it for the next requests (a replica read is only kept once the replicas caught up with its last invalidation)
+    payload = schemas.PostVoteResponse.model_validate(post).model_dump_json().encode()
+    if post_cache:
+        await post_cache.set_post(cache_key, headers, payload, replica=db.info["replica"])
+
     # Return the found post back to the Client
-    return post
+    return conditional_response(headers, payload, if_none_match)
 
 # DELETE ONE POST BY ID
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_post(id:int, db: Session = Depends(get_db),  current_user = Depends(oauth2.get_current_user)):
+async def delete_post(id:int, db: AsyncSession = Depends(get_async_db),  current_user = Depends(oauth2.get_current_user)):
 
-    # Create the post query matching the id passed in the URL
-    post_query = db.query(models.Post).filter(models.Post.id == id)
-    
-    # Get the post matched
-    post = post_query.first()
+    # Delete the post only if it belongs to the current user, in a single statement
+    deleted = (await db.execute(delete(models.Post)
+                                .filter(models.Post.id == id, models.Post.owner_id == current_user.id)
+                                .returning(models.Post.id)
+                                .execution_options(synchronize_session=False))).first()
+
+    # Nothing deleted: the post doesn't exist or it isn't the current user's
+    if not deleted:
+        raise await ownership_failure(db, id, current_user.id)
 
-    # Post look up guard (Actual query execution)
-    if not post:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id '{id}' doesn't exist!")
-    
-    # Authentication guard (The owner of the post is the one deleting it)
-    if post.owner_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Unauthorized! Only the owner of the post can alter it!")
-    
-    # Execute the post query to delete it from the DB
-    post_query.delete(synchronize_session = False)
-    
     # Commit the change to the DB
-    db.commit()
+    await db.commit()
+
+    # Drop the cached copies of the post, the feed pages shift after a deletion
+    if post_cache:
+        await post_cache.invalidate_post(id)
+        await post_cache.invalidate_feeds()
 
     return None # No response is necessary given the default status set in the decorator and we are not returning an entity in the response (There's not "response model" in the deco)
 
 # UPDATE ONE POST BY ID
 @router.put("/{id}", status_code=status.HTTP_200_OK, response_model=schemas.PostResponse)
-def update_post(id: int, post: schemas.PostCreate, db: Session = Depends(get_db),  current_user = Depends(oauth2.get_current_user)):
-    
-    # Create the post query matching the id passed in the URL
-    post_query = db.query(models.Post).filter(models.Post.id == id)
-   
-    # Get the post matched
-    updated_post = post_query.first()
+async def update_post(id: int, post: schemas.PostCreate, response: Response, db: AsyncSession = Depends(get_async_db),  current_user = Depends(oauth2.get_current_user)):
 
-    # Post look up guard (Actual query execution)
+    # Update the post only if it belongs to the current user, in a single statement
+    updated_post = await update_owned_post(db, id, current_user.id, post.model_dump(), true())
+
+    # Nothing updated: the post doesn't exist or it isn't the current user's
     if not updated_post:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id '{id}' doesn't exist!")
+        raise await ownership_failure(db, id, current_user.id)
+
+    # Commit the change to the DB
+    await db.commit()
+
+    # Drop the cached copies of the post, the new title / content may now match (or miss) cached searches
+    if post_cache:
+        await post_cache.invalidate_post(id)
+        await post_cache.invalidate_feeds()
+
+    # Return the updated found post back to the Client, along with its new version
+    response.headers["ETag"] = utils.post_etag(updated_post.id, updated_post.updated_at, updated_post.vote_count)
+    return post_item(updated_post)
 
-    # Authentication guard (The owner of the post is the one deleting it)
-    if updated_post.owner_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Unauthorized! Only the owner of the post can alter it!")
-    
-    # Execute the post query to update it in the DB
-    post_query.update(post.model_dump(), synchronize_session = False)
+# PARTIALLY UPDATE ONE POST BY ID
+@router.patch("/{id}", status_code=status.HTTP_200_OK, response_model=schemas.PostResponse)
+async def patch_post(id: int, post: schemas.PostUpdate, response: Response, db: AsyncSession = Depends(get_async_db),
+                     current_user = Depends(oauth2.get_current_user), if_match: Optional[str] = Header(None)):
+
+    # Only the fields sent by the Client are written
+    changes = post.model_dump(exclude_unset=True, exclude_none=True)
+
+    # Empty update guard
+    if not changes:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"No fields to update!")
+
+    # Update the post only if it belongs to the current user and is still the version the Client read (If-Match), in a single statement
+    updated_post = await update_owned_post(db, id, current_user.id, changes, if_match_filter(if_match, id))
+
+    # Nothing updated: the post doesn't exist, it isn't the current user's or it changed since the Client read it
+    if not updated_post:
+        raise await ownership_failure(db, id, current_user.id)
 
     # Commit the change to the DB
-    db.commit()
+    await db.commit()
+
+    # Drop the cached copies of the post, the new title / content may now match (or miss) cached searches
+    if post_cache:
+        await post_cache.invalidate_post(id)
+        await post_cache.invalidate_feeds()
 
-    # Return the updated found post back to the Client
-    return updated_post
+    # Return the updated found post back to the Client, along with its new version
+    response.headers["ETag"] = utils.post_etag(updated_post.id, updated_post.updated_at, updated_post.vote_count)
+    return post_item(updated_post)
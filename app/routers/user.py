@@ -1,14 +1,17 @@
 
 # 3RD PARTY IMPORTS
-from fastapi import status, HTTPException, Depends, APIRouter
-from sqlalchemy.orm import Session
+from fastapi import status, HTTPException, Depends, APIRouter, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, false, func, or_, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # LOCAL IMPORTS
 from app import schemas, models, utils, oauth2
-from app.database import get_db
+from app.cache import post_cache
+from app.database import get_async_db, get_read_db, stream_rows
 
 # BUILT-IN IMPORTS
-from typing import List
+from typing import List, Optional
 
 
 
@@ -19,25 +22,95 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 
 
+# Failure path of the ownership-scoped writes: revoked token (401), missing user (404), someone else's account (403)
+# or failed If-Match precondition (412)
+async def ownership_failure(db: AsyncSession, id: int, current_user: schemas.TokenData) -> HTTPException:
+
+    # Revocation guard (bumping 'users.token_version' invalidates every token issued before)
+    token_version = (await db.execute(select(models.User.token_version).filter(models.User.id == current_user.id))).scalar()
+    if token_version is None or token_version != current_user.token_version:
+        return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Could not validate credentials",
+                             headers={'WWW-Authenticate': "Bearer"})
+
+    # User look up guard
+    if not (await db.execute(select(models.User.id).filter(models.User.id == id))).first():
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id '{id}' doesn't exist!")
+
+    # Authentication guard (The owner of the account is the one altering it)
+    if id != current_user.id:
+        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Unauthorized! Only the owner of the account can alter it!")
+
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=f"User with id '{id}' was modified since it was read!")
+
+
+# If-Match precondition of a user write: the user must still be in (one of) the versions the client read
+def if_match_filter(if_match: Optional[str], id: int):
+
+    if not if_match or if_match.strip() == "*":
+        return true()
+
+    versions = [updated_at for user_id, updated_at in utils.parse_if_match(if_match, "u") if user_id == id]
+
+    return or_(false(), *(models.User.updated_at == updated_at for updated_at in versions))
+
+
+# Update of the current user's account if the token wasn't revoked & the precondition holds, read back in a single statement
+# (a new password bumps the token version, which revokes the tokens issued with the old one, the caller's included)
+async def update_own_user(db: AsyncSession, current_user: schemas.TokenData, values: dict, precondition):
+
+    if "password" in values:
+        values = {**values, "token_version": models.User.token_version + 1}
+
+    return (await db.execute(update(models.User)
+                             .filter(models.User.id == current_user.id, models.User.token_version == current_user.token_version, precondition)
+                             .values(**values, updated_at=func.now())
+                             .returning(models.User.id, models.User.created_at, models.User.updated_at))).first()
+
+
+
+
 # GET ALL USERS
 @router.get("/", response_model=List[schemas.UserResponse])
-def get_users(db: Session = Depends(get_db), current_user = Depends(oauth2.get_current_user)):
+async def get_users(db: AsyncSession = Depends(get_read_db), current_user = Depends(oauth2.get_current_user),
+                    limit: int = Query(100, ge=1, le=1000), skip: int = Query(0, ge=0), after_id: Optional[int] = None):
 
-    # Users query setting
-    users_query = db.query(models.User)
+    # Users query setting (only the columns 'UserResponse' serializes), one page in id order
+    users_query = select(models.User.id, models.User.created_at)\
+        .order_by(models.User.id)\
+        .limit(limit)\
+        .offset(skip)
+
+    # Keyset paging: start right after the last id of the previous page (no rows skipped over on deep pages)
+    if after_id is not None:
+        users_query = users_query.filter(models.User.id > after_id)
 
     # Users query executing
-    users = users_query.all()
+    users = (await db.execute(users_query)).all()
+
+    # Return the page of users, serialized straight from the row tuples
+    return Response(content=utils.json_bytes([{"id": id, "created_at": created_at} for id, created_at in users]),
+                    media_type="application/json")
 
-    # Return all users found in the DB
-    return users
+# EXPORT ALL USERS (declared before "/{id}" so "export" isn't taken as an id)
+@router.get("/export", response_class=StreamingResponse)
+async def export_users(current_user = Depends(oauth2.get_current_user)):
+
+    # Every user in id order
+    export_query = select(models.User.id, models.User.created_at).order_by(models.User.id)
+
+    # One JSON document per line, written batch by batch as the cursor advances
+    async def ndjson():
+        async for rows in stream_rows(export_query):
+            yield b"".join(utils.json_bytes({"id": id, "created_at": created_at}) + b"\n" for id, created_at in rows)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 # CREATE ONE USER
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    
-    # Hash the password passed by the Client
-    hashed_password = utils.hash(user.password)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+
+    # Hash the password passed by the Client (on the bcrypt process pool)
+    hashed_password = await utils.hash_async(user.password)
 
     # Update the password hashed
     user.password = hashed_password
@@ -49,121 +122,122 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(new_user)
 
     # Commit the change to the DB
-    db.commit()
+    await db.commit()
 
     # Update the user how it was created in the DB
-    db.refresh(new_user)
+    await db.refresh(new_user)
 
     # Return the newly created user back to the Client
     return new_user
 
 # GET ONE USER BY ID
 @router.get("/{id}", status_code=status.HTTP_200_OK, response_model=schemas.UserResponse)
-def get_user(id: int, db: Session = Depends(get_db), current_user = Depends(oauth2.get_current_user)):
+async def get_user(id: int, response: Response, db: AsyncSession = Depends(get_read_db), current_user = Depends(oauth2.get_current_user)):
 
     # Create the user query matching the id passed in the URL
-    user_query = db.query(models.User).filter(models.User.id == id)
+    user_query = select(models.User).filter(models.User.id == id)
 
     # Get the user matched
-    user = user_query.first()
+    user = (await db.execute(user_query)).scalars().first()
 
     # User look up guard (Actual query execution)
-    if not user.first():
+    if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id '{id}' was not found!")
-    
-    # Return the found user back to the Client
+
+    # Return the found user back to the Client, along with its version (for the If-Match of its updates)
+    response.headers["ETag"] = utils.user_etag(user.id, user.updated_at)
     return user
 
 # DELETE ONE USER BY ID
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(id: int, db: Session = Depends(get_db), current_user = Depends(oauth2.get_current_user)):
-
-    # Create the user query matching the id passed in the URL
-    user_query = db.query(models.User).filter(models.User.id == id)
+async def delete_user(id: int, db: AsyncSession = Depends(get_async_db), current_user = Depends(oauth2.get_current_user)):
 
-    # Get the user matched
-    user = user_query.first()
-    
-    # User look up guard (Actual query execution)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id '{id}' doesn't exist!")
-    
-    # Authentication guard (The owner of the post is the one deleting it)
-    if user.id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Unauthorized! Only the owner of the account can alter it!")
+    # Delete the account only if it is the current user's and the token wasn't revoked, in a single statement
+    deleted = None
+    if id == current_user.id:
+        deleted = (await db.execute(delete(models.User)
+                                    .filter(models.User.id == id, models.User.token_version == current_user.token_version)
+                                    .returning(models.User.id)
+                                    .execution_options(synchronize_session=False))).first()
 
-    # Execute the user query to delete it from the DB
-    user_query.delete(synchronize_session = False)
+    # Nothing deleted: revoked token, missing user or someone else's account
+    if not deleted:
+        raise await ownership_failure(db, id, current_user)
 
     # Commit the change to the DB
-    db.commit()
+    await db.commit()
+
+    # The tokens of the user are revoked on this worker right away (on the others within TOKEN_VERSION_TTL)
+    oauth2.token_versions.forget(id)
+
+    # The user's posts were deleted in cascade, the cached feed pages may still show them
+    if post_cache:
+        await post_cache.invalidate_feeds()
 
     return None # No response is necessary given the default status set in the decorator and we are not returning an entity in the response (There's not "response model" in the deco)
 
 # UPDATE ONE USER BY ID
 @router.put("/{id}", status_code=status.HTTP_200_OK, response_model=schemas.UserResponse)
-def update_user(id: int, user_update: schemas.UserCreate, db: Session = Depends(get_db), current_user = Depends(oauth2.get_current_user)):
-    
-    # Hash the password passed by the Client
-    hashed_password = utils.hash(user_update.password)
+async def update_user(id: int, user_update: schemas.UserCreate, response: Response, db: AsyncSession = Depends(get_async_db), current_user = Depends(oauth2.get_current_user)):
 
-    # Update the password hashed
-    user_update.password = hashed_password
+    # Someone else's account: fail before paying for the bcrypt hash
+    if id != current_user.id:
+        raise await ownership_failure(db, id, current_user)
 
-    # Create the user query matching the id passed in the URL
-    user_query = db.query(models.User).filter(models.User.id == id)
+    # Hash the password passed by the Client (on the bcrypt process pool)
+    user_update.password = await utils.hash_async(user_update.password)
 
-    # Get the user matched
-    auth_user = user_query.first()
-   
-    # User look up guard (Actual query execution)
-    if not user_query.first():
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id '{id}' doesn't exist!")
+    # Update the account in a single statement
+    updated_user = await update_own_user(db, current_user, user_update.model_dump(), true())
 
-    # Authentication guard (The owner of the post is the one deleting it)
-    if auth_user.id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Unauthorized! Only the owner of the account can alter it!")
-    
-    # Execute the user query to update it in the DB
-    user_query.update(user_update.model_dump(), synchronize_session = False)
+    # Nothing updated: revoked token or missing user
+    if not updated_user:
+        raise await ownership_failure(db, id, current_user)
 
     # Commit the change to the DB
-    db.commit()
-
-    # Store the executed queried user in a variable
-    updated_user = user_query.first()
-
-    # Return the updated found user back to the Client
-    return updated_user
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    await db.commit()
 
+    # The new password revoked the tokens of the user, on this worker right away (on the others within TOKEN_VERSION_TTL)
+    oauth2.token_versions.forget(id)
 
+    # Return the updated found user back to the Client, along with its new version
+    response.headers["ETag"] = utils.user_etag(updated_user.id, updated_user.updated_at)
+    return {"id": updated_user.id, "created_at": updated_user.created_at}
 
+# PARTIALLY UPDATE ONE USER BY ID
+@router.patch("/{id}", status_code=status.HTTP_200_OK, response_model=schemas.UserResponse)
+async def patch_user(id: int, user_update: schemas.UserUpdate, response: Response, db: AsyncSession = Depends(get_async_db),
+                     current_user = Depends(oauth2.get_current_user), if_match: Optional[str] = Header(None)):
 
+    # Someone else's account: fail before paying for the bcrypt hash
+    if id != current_user.id:
+        raise await ownership_failure(db, id, current_user)
 
+    # Only the fields sent by the Client are written
+    changes = user_update.model_dump(exclude_unset=True, exclude_none=True)
 
+    # Empty update guard
+    if not changes:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"No fields to update!")
 
+    # Hash the password only when a new one was sent (on the bcrypt process pool)
+    if "password" in changes:
+        changes["password"] = await utils.hash_async(changes["password"])
 
+    # Update the account if it is still the version the Client read (If-Match), in a single statement
+    updated_user = await update_own_user(db, current_user, changes, if_match_filter(if_match, id))
 
+    # Nothing updated: revoked token, missing user or it changed since the Client read it
+    if not updated_user:
+        raise await ownership_failure(db, id, current_user)
 
+    # Commit the change to the DB
+    await db.commit()
 
+    # A new password revoked the tokens of the user, on this worker right away (on the others within TOKEN_VERSION_TTL)
+    if "password" in changes:
+        oauth2.token_versions.forget(id)
 
+    # Return the updated found user back to the Client, along with its new version
+    response.headers["ETag"] = utils.user_etag(updated_user.id, updated_user.updated_at)
+    return {"id": updated_user.id, "created_at": updated_user.created_at}
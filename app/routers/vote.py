@@ -1,14 +1,18 @@
 
 # 3RD PARTY IMPORTS
-from fastapi import status, HTTPException, Depends, APIRouter
-from sqlalchemy.orm import Session
+from fastapi import status, HTTPException, Depends, APIRouter, Response
+from sqlalchemy import delete, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # LOCAL IMPORTS
 from app import schemas, models, oauth2
-from app.database import get_db
+from app.cache import post_cache
+from app.database import get_async_db
+from app.vote_queue import vote_queue
 
 # BUILT-IN IMPORTS
-...
+from typing import Iterable
 
 
 
@@ -19,58 +23,129 @@ router = APIRouter(prefix="/votes", tags=["Votes"])
 
 
 
-# MAKE A VOTE
-@router.post("/", status_code=status.HTTP_201_CREATED)
-def vote(vote: schemas.Vote, db: Session = Depends(get_db), current_user = Depends(oauth2.get_current_user)):
+# Statement casting the user's votes on the posts that exist and aren't voted yet, returning the posts voted
+def insert_votes(user_id: int, post_ids: Iterable[int]):
+
+    # INSERT ... SELECT FROM posts skips the missing posts, ON CONFLICT DO NOTHING the votes already cast
+    # (the 'votes_count_insert' trigger bumps 'posts.vote_count' of the rows actually inserted)
+    return insert(models.Vote)\
+        .from_select(["post_id", "user_id"], select(models.Post.id, literal(user_id)).filter(models.Post.id.in_(post_ids)))\
+        .on_conflict_do_nothing()\
+        .returning(models.Vote.post_id)
+
+
+# Statement retracting the user's votes on the posts, returning the posts that had a vote
+def delete_votes(user_id: int, post_ids: Iterable[int]):
+
+    # The 'votes_count_delete' trigger decrements 'posts.vote_count' of the rows actually deleted
+    return delete(models.Vote)\
+        .filter(models.Vote.user_id == user_id, models.Vote.post_id.in_(post_ids))\
+        .returning(models.Vote.post_id)\
+        .execution_options(synchronize_session=False)
+
 
+# Cast the user's votes (one statement), returns the posts voted
+async def add_votes(db: AsyncSession, user_id: int, post_ids: Iterable[int]) -> set[int]:
 
-    # Build a query to find if the post intented to be voted existis
-    post_query = db.query(models.Post).filter(models.Post.id == vote.post_id)
-    
-    # If the looked post doesn't exist
-    if not post_query.first():
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {vote.post_id}, does not exist")
+    return set((await db.execute(insert_votes(user_id, post_ids))).scalars().all())
 
 
-    # Build the vote query to see if it exist already
-    vote_query = db.query(models.Vote).filter(
-        models.Vote.post_id == vote.post_id,
-        models.Vote.user_id == current_user.id
-    )
+# Retract the user's votes (one statement), returns the posts that had a vote
+async def remove_votes(db: AsyncSession, user_id: int, post_ids: Iterable[int]) -> set[int]:
 
-    # Store the DB retrival of the query
-    found_vote = vote_query.first()
+    return set((await db.execute(delete_votes(user_id, post_ids))).scalars().all())
 
 
-    # If the intention is to vote for the post
+# Posts among 'post_ids' that exist (only asked on the failure path, to tell a missing post from a no-op vote)
+async def existing_posts(db: AsyncSession, post_ids: Iterable[int]) -> set[int]:
+
+    return set((await db.execute(select(models.Post.id).filter(models.Post.id.in_(post_ids)))).scalars().all())
+
+
+
+
+# MAKE A VOTE
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def vote(vote: schemas.Vote, response: Response, db: AsyncSession = Depends(get_async_db), current_user = Depends(oauth2.get_current_user)):
+
+    # Write-behind mode: validate the post, queue the vote & acknowledge it, the flusher writes it with the next batch
+    # (a full queue falls through to the direct write below)
+    if vote_queue:
+
+        if not await existing_posts(db, [vote.post_id]):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {vote.post_id}, does not exist")
+
+        if vote_queue.submit(current_user.id, vote.post_id, vote.dir):
+            response.status_code = status.HTTP_202_ACCEPTED
+            return {"message": "Vote accepted!"}
+
+    # Apply the vote in a single statement, concurrent double-submits can't both pass a check and then write
     if (vote.dir == 1):
+        changed = await add_votes(db, current_user.id, [vote.post_id])
+    else:
+        changed = await remove_votes(db, current_user.id, [vote.post_id])
+
+    # Nothing written: either the post doesn't exist or the vote was already in that state
+    if not changed:
+
+        if not await existing_posts(db, [vote.post_id]):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {vote.post_id}, does not exist")
 
-        # If the user already voted for that post
-        if found_vote:
+        if (vote.dir == 1):
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"User '{current_user.id}' has already voted on post '{vote.post_id}'")
 
-        # Otherwise, create the vote
-        new_vote = models.Vote(post_id=vote.post_id, user_id=current_user.id)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="The vote trying to be deleted does not exist!")
 
-        # Add the newly created vote to the DB and commit the change
-        db.add(new_vote)
-        db.commit()
+    # Commit the change to the DB
+    await db.commit()
 
-        return {"message":"Successfully added vote!"}
-    
-    # If the intetion is to remove the vote from the post
-    else:
+    # The cached copies of the post show the previous vote count
+    if post_cache:
+        await post_cache.invalidate_post(vote.post_id)
+
+    return {"message": "Successfully added vote!" if vote.dir == 1 else "Successfully deleted vote!"}
+
+# MAKE MANY VOTES
+@router.post("/batch", status_code=status.HTTP_200_OK, response_model=schemas.VoteBatchResponse)
+async def vote_batch(batch: schemas.VoteBatch, db: AsyncSession = Depends(get_async_db), current_user = Depends(oauth2.get_current_user)):
+
+    # Last item per post wins (e.g. an offline vote & unvote of the same post)
+    final = {item.post_id: item.dir for item in batch.items}
+    last = {item.post_id: index for index, item in enumerate(batch.items)}
+    to_add = [post_id for post_id, dir in final.items() if dir == 1]
+    to_remove = [post_id for post_id, dir in final.items() if dir != 1]
+
+    # One INSERT and one DELETE for the whole batch, in the same transaction
+    added = await add_votes(db, current_user.id, to_add) if to_add else set()
+    removed = await remove_votes(db, current_user.id, to_remove) if to_remove else set()
+
+    # The items that wrote nothing need to know whether their post exists
+    unchanged = [post_id for post_id in final if post_id not in added and post_id not in removed]
+    found = await existing_posts(db, unchanged) if unchanged else set()
 
-        # if the vote doesn't exists        
-        if not found_vote:            
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="The vote trying to be deleted does not exist!")
-        
-        # Delete the vote found in DB & commit the change
-        vote_query.delete(synchronize_session=False)
-        db.commit()
+    # Commit the change to the DB
+    await db.commit()
 
-        return {"message":"Successfully deleted vote!"}
+    # The cached copies of the voted posts show the previous vote counts
+    if post_cache:
+        for post_id in added | removed:
+            await post_cache.invalidate_post(post_id)
 
+    # Outcome of every item, in the order they were sent
+    results = []
+    for index, item in enumerate(batch.items):
 
+        if last[item.post_id] != index:
+            outcome = "superseded"
+        elif item.post_id in added:
+            outcome = "added"
+        elif item.post_id in removed:
+            outcome = "deleted"
+        elif item.post_id not in found:
+            outcome = "post_not_found"
+        else:
+            outcome = "already_voted" if item.dir == 1 else "not_voted"
 
+        results.append({"post_id": item.post_id, "dir": item.dir, "status": outcome})
 
+    return {"results": results}
@@ -1,6 +1,6 @@
 
 # 3RD PARTY IMPORTS
-from pydantic import BaseModel, EmailStr, Field, conint
+from pydantic import BaseModel, EmailStr, Field, WithJsonSchema, conint
 from typing_extensions import Annotated
 
 
@@ -9,7 +9,7 @@ from typing_extensions import Annotated
 
 # BUILT-IN IMPORTS
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional
 
 
 
@@ -30,6 +30,15 @@ class UserCreate(UserBase):
 
     pass
 
+class UserUpdate(BaseModel):
+
+    """
+    Partial update of a user (PATCH), only the fields sent are written
+    """
+
+    email: Optional[EmailStr] = None
+    password: Optional[str] = None
+
 class UserResponse(BaseModel):
 
     id: int
@@ -60,7 +69,12 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
 
+    """
+    Verified claims of an access token, this is the authenticated principal ('current_user') of the path operations
+    """
+
     id: Optional[int] = None
+    token_version: int = 0
 
 
 
@@ -81,6 +95,16 @@ class PostCreate(PostBase):
 
     pass
 
+class PostUpdate(BaseModel):
+
+    """
+    Partial update of a post (PATCH), only the fields sent are written
+    """
+
+    title: Optional[str] = None
+    content: Optional[str] = None
+    published: Optional[bool] = None
+
 class PostResponse(PostBase):
 
     id: int
@@ -92,6 +116,27 @@ class PostResponse(PostBase):
     class Config:
         from_attributes = True
 
+class PostBulk(BaseModel):
+
+    """
+    Posts created in a single statement, each item is validated as a 'PostCreate' on its own
+    so the invalid ones (not even an object included) are reported without failing the rest
+    """
+
+    items: Annotated[List[Annotated[Any, WithJsonSchema({"$ref": "#/components/schemas/PostCreate"})]],
+                     Field(min_length=1, max_length=1000)]
+
+class PostBulkResult(BaseModel):
+
+    index: int
+    status: Literal["created", "invalid"]
+    post: Optional[PostResponse] = None
+    errors: Optional[List[Dict[str, Any]]] = None
+
+class PostBulkResponse(BaseModel):
+
+    results: List[PostBulkResult]
+
 class PostVoteResponse(BaseModel):
 
     Post: PostResponse
@@ -101,6 +146,24 @@ class PostVoteResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class PostVoteFlagResponse(PostVoteResponse):
+
+    """
+    Feed item asked with 'voted_by_me', tells whether the current user voted the post
+    """
+
+    voted_by_me: bool
+
+class PostPage(BaseModel):
+
+    """
+    Envelope for the cursor (keyset) pagination mode of the posts feed, 'next_cursor' is None
+    when there are no more posts to fetch
+    """
+
+    items: List[PostVoteResponse]
+    next_cursor: Optional[str] = None
+
 
 
 # VOTE MODEL SCHEMAS
@@ -108,5 +171,22 @@ class Vote(BaseModel):
 
     post_id: int
     dir: Annotated[int, Field(strict=True, le=1)]   # This line is to make sure is either 0 or 1
-    
-        
\ No newline at end of file
+
+class VoteBatch(BaseModel):
+
+    """
+    Votes of one user applied in a single transaction (e.g. the offline votes of a client),
+    when a post comes more than once the last item wins
+    """
+
+    items: Annotated[List[Vote], Field(min_length=1, max_length=500)]
+
+class VoteOutcome(BaseModel):
+
+    post_id: int
+    dir: int
+    status: Literal["added", "deleted", "already_voted", "not_voted", "post_not_found", "superseded"]
+
+class VoteBatchResponse(BaseModel):
+
+    results: List[VoteOutcome]
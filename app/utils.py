@@ -1,17 +1,36 @@
 
 # 3RD PARTY IMPORTS
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from decouple import config
+import orjson
 
 # LOCAL IMPORTS
 ...
 
 # BUILT-IN IMPORTS
-...
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from functools import lru_cache
+from typing import Optional, Union
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import re
+import secrets
+
 
 
+# Password hashing settings
+BCRYPT_ROUNDS = config('BCRYPT_ROUNDS', default=12, cast=int)
+HASH_WORKERS = config('HASH_WORKERS', default=2, cast=int)          # Processes dedicated to bcrypt
+HASH_QUEUE_SIZE = config('HASH_QUEUE_SIZE', default=64, cast=int)   # Jobs allowed to wait for a free process before answering 503
 
-# Passlib algorithm setting
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Passlib algorithm setting (hashes made with a lower cost than the configured one are flagged by 'needs_update')
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS, bcrypt__min_rounds=BCRYPT_ROUNDS)
 
 
 # Initial Hash Function
@@ -30,8 +49,222 @@ def compare_pwds(plain_pwd:str, hashed_pwd:str) -> bool:
     return pwd_context.verify(plain_pwd, hashed_pwd)
 
 
+# Comparator of passwords that also upgrades outdated hashes
+def verify_and_update(plain_pwd:str, hashed_pwd:str) -> tuple[bool, Optional[str]]:
+
+    """This function compares two passwords and, if they match but the hash is outdated, returns the new hash to store"""
+
+    return pwd_context.verify_and_update(plain_pwd, hashed_pwd)
+
+
+# Hash compared against on the login attempts with an unknown email
+@lru_cache(maxsize=1)
+def dummy_hash() -> str:
+
+    """This function returns a throwaway hash made with the current cost, so a miss costs the same bcrypt work as a hit"""
+
+    return pwd_context.hash(secrets.token_urlsafe(16))
+
+
+
+
+# BCRYPT PROCESS POOL
+# bcrypt burns a few hundred ms of CPU per call, it runs on its own processes so it neither holds
+# the event loop / threadpool nor competes for the GIL with the requests being served
+_hash_executor: Optional[ProcessPoolExecutor] = None
+_hash_jobs = 0
+
+
+def start_hash_pool() -> None:
+
+    """
+    This function starts the bcrypt processes, called when the server starts. They come from a 'forkserver'
+    (a clean single threaded process), forking the server itself would copy the locks held by its threads
+    """
+
+    global _hash_executor
+
+    if _hash_executor is None:
+        _hash_executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+
+
+async def _run_hash_job(fn, *args):
+
+    global _hash_jobs
+
+    # Backpressure guard: shed the load instead of queueing logins behind each other indefinitely
+    if _hash_jobs >= HASH_WORKERS + HASH_QUEUE_SIZE:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Server busy, try again later!",
+                            headers={"Retry-After": "1"})
+
+    # Scripts run without the app lifespan
+    start_hash_pool()
+
+    _hash_jobs += 1
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+
+    finally:
+        _hash_jobs -= 1
+
+
+async def hash_async(password:str) -> str:
+
+    """Async version of 'hash' that runs on the bcrypt process pool"""
+
+    return await _run_hash_job(hash, password)
+
+
+async def compare_pwds_async(plain_pwd:str, hashed_pwd:str) -> bool:
+
+    """Async version of 'compare_pwds' that runs on the bcrypt process pool"""
+
+    return await _run_hash_job(compare_pwds, plain_pwd, hashed_pwd)
+
+
+async def verify_and_update_async(plain_pwd:str, hashed_pwd:str) -> tuple[bool, Optional[str]]:
+
+    """Async version of 'verify_and_update' that runs on the bcrypt process pool"""
+
+    return await _run_hash_job(verify_and_update, plain_pwd, hashed_pwd)
+
+
+def shutdown_hash_pool() -> None:
+
+    """This function stops the bcrypt processes, called when the server shuts down"""
+
+    global _hash_executor
+
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+
+# Feed cursor encoder
+def encode_cursor(key:Union[datetime, float, int], id:int, sort:str = "new") -> str:
+
+    """
+    This function packs the (sort key, id) keyset of the last post served into an opaque cursor,
+    the key is the created_at of the 'new' feed or the score of the ranked ones ('hot' / 'top')
+    """
+
+    keyset = [key.isoformat(), id] if sort == "new" else [sort, key, id]
+    raw = json.dumps(keyset, separators=(",", ":")).encode()
+
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# Feed cursor decoder
+def decode_cursor(cursor:str, sort:str = "new") -> tuple[Union[datetime, float, int], int]:
+
+    """This function unpacks a cursor made by 'encode_cursor' for the same sort, raises ValueError if it was tampered with"""
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        keyset = json.loads(urlsafe_b64decode(padded.encode()))
+
+        if sort == "new":
+            created_at, id = keyset
+            return datetime.fromisoformat(created_at), int(id)
+
+        cursor_sort, key, id = keyset
+        if cursor_sort != sort:
+            raise ValueError(f"Cursor of the '{cursor_sort}' feed")
+        return (float(key) if sort == "hot" else int(key)), int(id)
+
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: '{cursor}'") from e
+
+
+# LIKE pattern builder
+def like_pattern(term:str) -> str:
+
+    """This function returns a '%term%' pattern with the LIKE wildcards of the term escaped (escape character: backslash)"""
+
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    return f"%{escaped}%"
+
+
+
+
+# HTTP CONDITIONAL REQUESTS HELPERS
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+# Post ETag builder
+def post_etag(id:int, updated_at:datetime, vote_count:int) -> str:
+
+    """This function returns the strong ETag of a post, it changes whenever the post is edited or voted"""
+
+    return f'"p{id}-{(updated_at - _EPOCH) // timedelta(microseconds=1):x}-{vote_count}"'
+
+
+# User ETag builder
+def user_etag(id:int, updated_at:datetime) -> str:
+
+    """This function returns the strong ETag of a user, it changes whenever the user is edited"""
+
+    return f'"u{id}-{(updated_at - _EPOCH) // timedelta(microseconds=1):x}"'
+
+
+# If-Match parser of the post & user ETags
+def parse_if_match(if_match:str, kind:str) -> list[tuple]:
+
+    """
+    This function unpacks the strong ETags of an If-Match header made by 'post_etag' (kind 'p') or 'user_etag' (kind 'u')
+    into (id, updated_at[, vote_count]) tuples, the weak or unknown ones are left out (they never match, RFC 9110)
+    """
+
+    validators = []
+
+    for candidate in if_match.split(","):
+        match = re.fullmatch(rf'"{kind}(\d+)-([0-9a-f]+)(?:-(\d+))?"', candidate.strip())
+        if match and (match[3] is not None) == (kind == "p"):
+            id, updated_at = int(match[1]), _EPOCH + timedelta(microseconds=int(match[2], 16))
+            validators.append((id, updated_at, int(match[3])) if kind == "p" else (id, updated_at))
+
+    return validators
+
+
+# Feed page ETag builder
+def feed_etag(item_etags:list[str], next_cursor:Optional[str] = None) -> str:
+
+    """This function returns the strong ETag of a feed page from the ETags of the posts it shows"""
+
+    digest = hashlib.sha1("|".join([*item_etags, next_cursor or ""]).encode()).hexdigest()
+
+    return f'"f{digest}"'
+
+
+# If-None-Match evaluation
+def etag_matches(if_none_match:Optional[str], etag:str) -> bool:
+
+    """This function tells whether an If-None-Match header matches the ETag (weak comparison, as RFC 9110 asks for GETs)"""
+
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+
+    return etag.removeprefix("W/") in candidates
+
+
+# HTTP-date formatter
+def http_date(moment:datetime) -> str:
+
+    """This function formats a datetime as an HTTP-date (Last-Modified header)"""
 
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
 
 
+# JSON serializer of the hand built responses
+def json_bytes(content) -> bytes:
 
+    """This function serializes a response body with orjson, UTC datetimes end in 'Z' like the Pydantic serialized ones"""
 
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
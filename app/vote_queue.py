@@ -0,0 +1,216 @@
+
+# 3RD PARTY IMPORTS
+from decouple import config
+from sqlalchemy import Integer, column, delete, select, tuple_, values
+from sqlalchemy.dialects.postgresql import insert
+
+# LOCAL IMPORTS
+from app import models
+from app.cache import post_cache
+from app.database import AsyncSessionLocal
+
+# BUILT-IN IMPORTS
+from typing import Optional
+import asyncio
+import logging
+import threading
+import time
+
+
+
+
+# WRITE-BEHIND SETTINGS
+VOTE_WRITE_BEHIND = config('VOTE_WRITE_BEHIND', default=False, cast=bool)
+VOTE_FLUSH_SIZE = config('VOTE_FLUSH_SIZE', default=500, cast=int)              # Votes that trigger a flush right away
+VOTE_FLUSH_INTERVAL = config('VOTE_FLUSH_INTERVAL', default=0.05, cast=float)   # Seconds a vote may wait for its batch
+VOTE_QUEUE_MAX = config('VOTE_QUEUE_MAX', default=10000, cast=int)               # Past this the votes are written directly
+
+logger = logging.getLogger(__name__)
+
+
+
+
+# VOTES WRITE-BEHIND QUEUE
+class VoteQueue:
+
+    """
+    In-process buffer of the acknowledged votes, flushed in coalesced batches (one transaction, one INSERT and
+    one DELETE per batch) so a viral post takes one counter update per flush instead of one per vote.
+
+    The queued votes are lost if the process dies before a flush, a clean shutdown flushes them (see the lifespan)
+    """
+
+    def __init__(self, flush_size: int, flush_interval: float, maxsize: int):
+
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.flushed_votes = 0
+        self.failed_votes = 0
+        self.flush_total = 0.0
+        self.flush_max = 0.0
+        self.flush_last = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+
+        self._queue = asyncio.Queue(self.maxsize)
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+
+        # The sentinel goes behind the queued votes, the flusher writes them all before exiting
+        if self.running:
+            await self._queue.put(None)
+            self._full.set()
+            await self._task
+
+        # A flusher that died left its queued votes behind, they are written here
+        if self._queue is not None:
+            while not self._queue.empty():
+                batch = [self._queue.get_nowait() for _ in range(min(self.flush_size, self._queue.qsize()))]
+                await self._flush([item for item in batch if item is not None])
+
+    def submit(self, user_id: int, post_id: int, dir: int) -> bool:
+
+        """Queues a validated vote, False if it can't be taken (not running or full) and must be written directly"""
+
+        if not self.running:
+            return False
+
+        try:
+            self._queue.put_nowait((user_id, post_id, dir))
+        except asyncio.QueueFull:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        with self._lock:
+            self.enqueued += 1
+
+        # Size trigger
+        if self._queue.qsize() >= self.flush_size:
+            self._full.set()
+
+        return True
+
+    async def _run(self) -> None:
+
+        while True:
+
+            batch = [await self._queue.get()]
+
+            # Time trigger: give the batch 'flush_interval' to fill unless it already is full
+            if batch[0] is not None and self._queue.qsize() < self.flush_size - 1:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            while len(batch) < self.flush_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            stopping = None in batch
+            await self._flush([item for item in batch if item is not None])
+
+            # On shutdown keep flushing until nothing is left
+            if stopping:
+                while not self._queue.empty():
+                    batch = [self._queue.get_nowait() for _ in range(min(self.flush_size, self._queue.qsize()))]
+                    await self._flush([item for item in batch if item is not None])
+                return
+
+    async def _flush(self, batch: list[tuple[int, int, int]]) -> None:
+
+        if not batch:
+            return
+
+        # Coalesce: the last vote of a user on a post is the one that counts
+        final = {(user_id, post_id): dir for user_id, post_id, dir in batch}
+        to_add = [(post_id, user_id) for (user_id, post_id), dir in final.items() if dir == 1]
+        to_remove = [(user_id, post_id) for (user_id, post_id), dir in final.items() if dir != 1]
+        changed = set()
+        start = time.perf_counter()
+
+        try:
+            async with AsyncSessionLocal() as db:
+
+                # Votes on posts / users removed since they were acknowledged are skipped, duplicates are no-ops
+                if to_add:
+                    pairs = values(column("post_id", Integer), column("user_id", Integer), name="pairs").data(to_add)
+                    insert_query = insert(models.Vote)\
+                        .from_select(["post_id", "user_id"], select(pairs.c.post_id, pairs.c.user_id)
+                                     .join(models.Post, models.Post.id == pairs.c.post_id)
+                                     .join(models.User, models.User.id == pairs.c.user_id))\
+                        .on_conflict_do_nothing()\
+                        .returning(models.Vote.post_id)
+                    changed.update((await db.execute(insert_query)).scalars().all())
+
+                if to_remove:
+                    delete_query = delete(models.Vote)\
+                        .filter(tuple_(models.Vote.user_id, models.Vote.post_id).in_(to_remove))\
+                        .returning(models.Vote.post_id)\
+                        .execution_options(synchronize_session=False)
+                    changed.update((await db.execute(delete_query)).scalars().all())
+
+                await db.commit()
+
+        except Exception:
+            logger.exception("Vote flush of %d votes failed", len(final))
+            with self._lock:
+                self.failed_votes += len(final)
+            return
+
+        # The cached copies of the voted posts show the previous vote counts (the votes are written, a cache error
+        # only leaves those copies until their TTL)
+        if post_cache:
+            try:
+                for post_id in changed:
+                    await post_cache.invalidate_post(post_id)
+            except Exception:
+                logger.exception("Cache invalidation of %d voted posts failed", len(changed))
+
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.flushes += 1
+            self.flushed_votes += len(final)
+            self.coalesced += len(batch) - len(final)
+            self.flush_total += elapsed
+            self.flush_max = max(self.flush_max, elapsed)
+            self.flush_last = elapsed
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            return {
+                "running": self.running,
+                "depth": self._queue.qsize() if self._queue is not None else 0,
+                "max_depth": self.maxsize,
+                "enqueued": self.enqueued,
+                "rejected": self.rejected,
+                "coalesced": self.coalesced,
+                "flushes": self.flushes,
+                "flushed_votes": self.flushed_votes,
+                "failed_votes": self.failed_votes,
+                "flush_seconds_avg": round(self.flush_total / self.flushes, 6) if self.flushes else 0.0,
+                "flush_seconds_max": round(self.flush_max, 6),
+                "flush_seconds_last": round(self.flush_last, 6),
+            }
+
+
+# Queue instance used by the votes path operation (None when VOTE_WRITE_BEHIND is off)
+vote_queue = VoteQueue(VOTE_FLUSH_SIZE, VOTE_FLUSH_INTERVAL, VOTE_QUEUE_MAX) if VOTE_WRITE_BEHIND else None
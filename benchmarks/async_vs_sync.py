@@ -0,0 +1,85 @@
+
+"""
+Load benchmark of the sync (psycopg2 + threadpool) and async (asyncpg + event loop) DB paths
+
+Both paths serve the same feed query from a bench app, so the only difference is how the request
+waits on Postgres. '--db-latency' adds a pg_sleep to every request to emulate a remote database,
+that's where the threadpool cap of the sync path shows up.
+
+    python -m benchmarks.async_vs_sync --requests 2000 --concurrency 100 --db-latency 0.01
+"""
+
+# 3RD PARTY IMPORTS
+from fastapi import Depends, FastAPI
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import httpx
+
+# LOCAL IMPORTS
+from app import models
+from app.database import get_db, get_async_db, engine, async_engine
+from benchmarks.common import run_load
+
+# BUILT-IN IMPORTS
+import argparse
+import asyncio
+import json
+
+
+
+
+# Bench app exposing the same query through both paths
+def build_app(db_latency: float, limit: int) -> FastAPI:
+
+    app = FastAPI()
+    feed_query = select(models.Post.id, models.Post.title, models.Post.vote_count)\
+        .order_by(models.Post.created_at.desc(), models.Post.id.desc())\
+        .limit(limit)
+
+    @app.get("/sync/posts")
+    def sync_posts(db: Session = Depends(get_db)):
+        if db_latency:
+            db.execute(text("SELECT pg_sleep(:s)"), {"s": db_latency})
+        return [dict(row._mapping) for row in db.execute(feed_query)]
+
+    @app.get("/async/posts")
+    async def async_posts(db: AsyncSession = Depends(get_async_db)):
+        if db_latency:
+            await db.execute(text("SELECT pg_sleep(:s)"), {"s": db_latency})
+        return [dict(row._mapping) for row in await db.execute(feed_query)]
+
+    return app
+
+
+async def main(args) -> dict:
+
+    app = build_app(args.db_latency, args.limit)
+    report = {"config": vars(args), "results": {}}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+        for path in ("sync", "async"):
+
+            # Warm up the pool & the statement caches before measuring
+            await run_load(client, "GET", f"/{path}/posts", args.concurrency, args.concurrency)
+
+            report["results"][path] = await run_load(client, "GET", f"/{path}/posts", args.requests, args.concurrency)
+
+    await async_engine.dispose()
+    engine.dispose()
+
+    return report
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare the sync and async DB paths under load")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10, help="Posts per feed page")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Seconds of pg_sleep added to every request")
+
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
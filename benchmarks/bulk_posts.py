@@ -0,0 +1,75 @@
+
+"""
+Post import throughput, one POST /posts per item against POST /posts/bulk batches
+
+Reports the rows per second of each path along with the SQL statements per row. The posts are created
+by a bench user and stay in the database.
+
+    python -m benchmarks.bulk_posts --rows 2000 --batch-size 500 --concurrency 8
+"""
+
+# 3RD PARTY IMPORTS
+import httpx
+
+# LOCAL IMPORTS
+from app import oauth2
+from app.database import async_engine
+from app.instrumentation import QueryCounter
+from app.main import app
+from benchmarks.common import run_requests
+from benchmarks.seed import seed_user
+
+# BUILT-IN IMPORTS
+import argparse
+import asyncio
+import json
+
+
+
+
+def item(n: int) -> dict:
+    return {"title": f"Imported post {n}", "content": f"Bulk import benchmark item {n}"}
+
+
+async def main(args) -> dict:
+
+    user_id = seed_user()
+    token = oauth2.create_access_token(data={"user_id": user_id, "ver": 0})
+    batches = [[item(n) for n in range(start, min(start + args.batch_size, args.rows))] for start in range(0, args.rows, args.batch_size)]
+
+    # (description, request builder, requests)
+    cases = [
+        ("single (POST /posts)", lambda n: ("POST", "/posts/", {"json": item(n)}), args.rows),
+        (f"bulk (POST /posts/bulk, {args.batch_size} per request)", lambda n: ("POST", "/posts/bulk", {"json": {"items": batches[n]}}), len(batches)),
+    ]
+
+    report = {"config": vars(args), "results": {}}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+
+        for description, make_request, total in cases:
+
+            with QueryCounter(async_engine.sync_engine) as queries:
+                result = await run_requests(client, make_request, total, min(args.concurrency, total))
+
+            elapsed = result["requests"] / result["throughput_rps"] if result["throughput_rps"] else 0.0
+            result["rows_per_second"] = round(args.rows / elapsed, 2) if elapsed else 0.0
+            result["statements_per_row"] = round(queries.count / args.rows, 3)
+            report["results"][description] = result
+
+    await async_engine.dispose()
+
+    return report
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare the single & bulk post creation throughput")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,83 @@
+
+# 3RD PARTY IMPORTS
+import httpx
+
+# LOCAL IMPORTS
+...
+
+# BUILT-IN IMPORTS
+from typing import Callable
+import asyncio
+import statistics
+import time
+
+
+
+
+# Percentile of a list of samples (nearest rank)
+def percentile(samples: list[float], pct: float) -> float:
+
+    """This function returns the 'pct' percentile of the samples, 0 if there are none"""
+
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+
+    return ordered[rank]
+
+
+# Latency & throughput summary of a load run
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+
+    """This function reduces the per-request latencies (seconds) of a run to the figures we compare between commits"""
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+# Closed loop load generator
+async def run_load(client: httpx.AsyncClient, method: str, url: str, total: int, concurrency: int, **request_kwargs) -> dict:
+
+    """
+    This function fires 'total' requests at 'url' keeping 'concurrency' of them in flight at all times,
+    any non 2xx/3xx response is counted as an error
+    """
+
+    return await run_requests(client, lambda n: (method, url, request_kwargs), total, concurrency)
+
+
+# Closed loop load generator of varying requests
+async def run_requests(client: httpx.AsyncClient, make_request: Callable[[int], tuple[str, str, dict]], total: int, concurrency: int) -> dict:
+
+    """
+    This function fires the 'total' requests built by 'make_request(n)' -> (method, url, request kwargs) keeping
+    'concurrency' of them in flight at all times, any non 2xx/3xx response is counted as an error
+    """
+
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for n in remaining:
+            method, url, request_kwargs = make_request(n)
+            start = time.perf_counter()
+            response = await client.request(method, url, **request_kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return summarize(latencies, time.perf_counter() - started, errors)
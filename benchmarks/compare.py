@@ -0,0 +1,64 @@
+
+"""
+Diff of two 'benchmarks.suite' reports, scenario by scenario (after vs before, in %)
+
+    python -m benchmarks.compare before.json after.json
+"""
+
+# 3RD PARTY IMPORTS
+...
+
+# LOCAL IMPORTS
+...
+
+# BUILT-IN IMPORTS
+import argparse
+import json
+
+
+
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "statements_per_request", "errors")
+
+
+# Relative change between two figures
+def change(before: float, after: float) -> str:
+
+    if before == after:
+        return "="
+    if not before:
+        return "new"
+
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main(args) -> None:
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{before['revision']} -> {after['revision']}")
+
+    for name, result in after["results"].items():
+
+        base = before["results"].get(name)
+        if base is None:
+            print(f"\n{name}: only in {args.after}")
+            continue
+
+        print(f"\n{name}")
+        for metric in METRICS:
+            print(f"  {metric:<24}{base.get(metric, 0):>12}{result.get(metric, 0):>12}  {change(base.get(metric, 0), result.get(metric, 0))}")
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare two benchmark suite reports")
+    parser.add_argument("before")
+    parser.add_argument("after")
+
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+
+"""
+Load benchmark of the personalized feed against the current one
+
+Compares GET /posts as it was (no flag) with 'voted_by_me' (correlated EXISTS in the same query) and
+'owner_only', reporting latency, throughput and SQL statements per request. The post reads cache is
+switched off so every request reaches Postgres.
+
+    python -m benchmarks.feed_personalized --requests 1000 --concurrency 16 --limit 25
+"""
+
+# 3RD PARTY IMPORTS
+from fastapi import FastAPI
+import httpx
+
+# LOCAL IMPORTS
+from app import models, oauth2
+from app.database import SessionLocal, async_engine
+from app.instrumentation import QueryCounter
+from app.routers import post
+from benchmarks.common import run_load
+from benchmarks.seed import seed_user
+
+# BUILT-IN IMPORTS
+import argparse
+import asyncio
+import json
+
+
+
+
+# Vote every other post of the page so the flag takes both values
+def seed_votes(user_id: int, limit: int) -> None:
+
+    db = SessionLocal()
+
+    try:
+        post_ids = [id for id, in db.query(models.Post.id).order_by(models.Post.created_at.desc(), models.Post.id.desc()).limit(limit)]
+        voted = {id for id, in db.query(models.Vote.post_id).filter(models.Vote.user_id == user_id, models.Vote.post_id.in_(post_ids))}
+        db.add_all([models.Vote(post_id=id, user_id=user_id) for id in post_ids[::2] if id not in voted])
+        db.commit()
+
+    finally:
+        db.close()
+
+
+async def main(args) -> dict:
+
+    user_id = seed_user()
+    seed_votes(user_id, args.limit)
+    token = oauth2.create_access_token(data={"user_id": user_id, "ver": 0})
+
+    app = FastAPI()
+    app.include_router(post.router)
+    post.post_cache = None
+
+    report = {"config": vars(args), "results": {}}
+    cases = {"current feed": {"limit": args.limit},
+             "voted_by_me": {"limit": args.limit, "voted_by_me": True},
+             "voted_by_me + owner_only": {"limit": args.limit, "voted_by_me": True, "owner_only": True}}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+
+        for case, params in cases.items():
+
+            # Warm up the pool & the statement caches before measuring
+            await run_load(client, "GET", "/posts/", args.concurrency, args.concurrency, params=params)
+
+            with QueryCounter(async_engine.sync_engine) as queries:
+                result = await run_load(client, "GET", "/posts/", args.requests, args.concurrency, params=params)
+
+            result["statements_per_request"] = round(queries.count / args.requests, 2)
+            report["results"][case] = result
+
+    await async_engine.dispose()
+
+    return report
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare the feed with & without the 'voted_by_me' flag")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=25)
+
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,105 @@
+
+"""
+Login throughput benchmark, the current 'routers/auth.login' against the previous implementation
+
+Reports latency, throughput and SQL statements per request for known and unknown emails, the gap between
+both shows whether the response time leaks which emails exist.
+
+    python -m benchmarks.login --requests 200 --concurrency 8
+"""
+
+# 3RD PARTY IMPORTS
+from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi.security.oauth2 import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import httpx
+
+# LOCAL IMPORTS
+from app import models, oauth2, utils
+from app.database import SessionLocal, async_engine, get_async_db
+from app.instrumentation import QueryCounter
+from app.routers import auth
+from benchmarks.common import run_load
+
+# BUILT-IN IMPORTS
+import argparse
+import asyncio
+import json
+
+
+
+
+BENCH_EMAIL = "bench-login@example.com"
+BENCH_PASSWORD = "bench-password"
+
+
+# Previous login implementation: two identical SELECTs and no bcrypt work on unknown emails
+async def legacy_login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+
+    user_query = select(models.User).filter(models.User.email == user_credentials.username)
+
+    if not (await db.execute(user_query)).scalars().first():
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid Credentials!")
+
+    user = (await db.execute(user_query)).scalars().first()
+
+    if not await utils.compare_pwds_async(user_credentials.password, user.password):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid Credentials!")
+
+    return {"access_token": oauth2.create_access_token(data={"user_id": user.id}), "token_type": "bearer"}
+
+
+# Make sure the bench user exists
+def seed_user() -> None:
+
+    db = SessionLocal()
+
+    try:
+        if not db.query(models.User.id).filter(models.User.email == BENCH_EMAIL).first():
+            db.add(models.User(email=BENCH_EMAIL, password=utils.hash(BENCH_PASSWORD)))
+            db.commit()
+
+    finally:
+        db.close()
+
+
+async def main(args) -> dict:
+
+    seed_user()
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.add_api_route("/legacy/login", legacy_login, methods=["POST"])
+
+    report = {"config": vars(args), "results": {}}
+    cases = {"hit": {"username": BENCH_EMAIL, "password": BENCH_PASSWORD},
+             "miss": {"username": "nobody@example.com", "password": BENCH_PASSWORD}}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+        for path in ("/legacy/login", "/login"):
+
+            for case, form in cases.items():
+
+                with QueryCounter(async_engine.sync_engine) as queries:
+                    result = await run_load(client, "POST", path, args.requests, args.concurrency, data=form)
+
+                result["statements_per_request"] = round(queries.count / args.requests, 2)
+                report["results"][f"{path} ({case})"] = result
+
+    await async_engine.dispose()
+    utils.shutdown_hash_pool()
+
+    return report
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the login path operation")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
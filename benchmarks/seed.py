@@ -0,0 +1,121 @@
+
+"""
+Benchmark data set: bench users, posts and votes in the database the DB_* settings point at
+
+Idempotent, only the missing rows are added so consecutive runs (and commits) measure the same volumes.
+Every bench user logs in with BENCH_PASSWORD. Point the DB_* settings at a throwaway Postgres, e.g.
+
+    docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgres:16 && alembic upgrade head
+    python -m benchmarks.seed --users 100 --posts 5000 --votes 20000
+"""
+
+# 3RD PARTY IMPORTS
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+# LOCAL IMPORTS
+from app import models, utils
+from app.database import SessionLocal
+
+# BUILT-IN IMPORTS
+import argparse
+import random
+
+
+
+
+BENCH_EMAIL = "bench-{}@bench.example.com"
+BENCH_PASSWORD = "bench-password"
+CHUNK = 1000
+
+
+# Seed the bench data set up to the given volumes, returns the ids of the bench users & posts
+def seed(users: int, posts: int, votes: int, rng_seed: int = 0) -> dict:
+
+    db = SessionLocal()
+    rng = random.Random(rng_seed)
+
+    try:
+        # Bench users (one bcrypt hash shared by all of them)
+        user_ids = list(db.execute(select(models.User.id).filter(models.User.email.like(BENCH_EMAIL.format("%"))).order_by(models.User.id)).scalars())
+
+        if len(user_ids) < users:
+            password = utils.hash(BENCH_PASSWORD)
+            rows = [{"email": BENCH_EMAIL.format(n), "password": password} for n in range(len(user_ids), users)]
+            for start in range(0, len(rows), CHUNK):
+                user_ids += db.execute(pg_insert(models.User).values(rows[start:start + CHUNK])
+                                       .on_conflict_do_nothing().returning(models.User.id)).scalars().all()
+            db.commit()
+
+        user_ids = user_ids[:users]
+
+        # Bench posts, owned round robin by the bench users
+        post_ids = list(db.execute(select(models.Post.id).filter(models.Post.owner_id.in_(user_ids)).order_by(models.Post.id)).scalars())
+
+        if len(post_ids) < posts:
+            rows = [{"title": f"Bench post {n}", "content": f"Benchmark post number {n} " + "lorem ipsum " * rng.randint(5, 50),
+                     "owner_id": user_ids[n % len(user_ids)]} for n in range(len(post_ids), posts)]
+            for start in range(0, len(rows), CHUNK):
+                post_ids += db.execute(insert(models.Post).values(rows[start:start + CHUNK]).returning(models.Post.id)).scalars().all()
+            db.commit()
+
+        post_ids = post_ids[:posts]
+
+        # Bench votes on random (user, post) pairs, the triggers keep 'posts.vote_count' in step
+        current = db.execute(select(func.count()).select_from(models.Vote).filter(models.Vote.user_id.in_(user_ids))).scalar()
+        missing = min(votes, len(user_ids) * len(post_ids)) - current
+
+        while missing > 0:
+            pairs = {(rng.choice(post_ids), rng.choice(user_ids)) for _ in range(min(missing, CHUNK))}
+            rows = [{"post_id": post_id, "user_id": user_id} for post_id, user_id in pairs]
+            inserted = len(db.execute(pg_insert(models.Vote).values(rows).on_conflict_do_nothing()
+                                      .returning(models.Vote.post_id)).scalars().all())
+            db.commit()
+
+            # Near saturation the random pairs keep hitting existing votes
+            if not inserted:
+                break
+            missing -= inserted
+
+        return {"user_ids": user_ids, "post_ids": post_ids}
+
+    finally:
+        db.close()
+
+
+# Make sure the single bench user of the per-request checks exists and owns enough posts to fill a page, returns its id
+def seed_user(email: str = "bench-queries@example.com", posts: int = 25) -> int:
+
+    db = SessionLocal()
+
+    try:
+        user = db.query(models.User).filter(models.User.email == email).first()
+
+        if not user:
+            user = models.User(email=email, password=utils.hash(BENCH_PASSWORD))
+            db.add(user)
+            db.commit()
+
+        missing = posts - db.query(models.Post).filter(models.Post.owner_id == user.id).count()
+        db.add_all([models.Post(title=f"Bench post {n}", content="Query count check", owner_id=user.id) for n in range(max(0, missing))])
+        db.commit()
+
+        return user.id
+
+    finally:
+        db.close()
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Seed the benchmark data set")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--votes", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = seed(args.users, args.posts, args.votes, args.seed)
+    print(f"Seeded {len(data['user_ids'])} user(s) & {len(data['post_ids'])} post(s)")
@@ -0,0 +1,158 @@
+
+"""
+Benchmark suite of every router, run against 'main.app' in process (httpx + ASGITransport, lifespan included)
+
+Seeds the data set ('benchmarks.seed'), then runs each scenario with a closed loop load and reports latency
+percentiles, throughput and SQL statements per request as JSON, tagged with the commit it ran on:
+
+    python -m benchmarks.suite --output before.json
+    git checkout <other commit>
+    python -m benchmarks.suite --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Run it with CACHE_BACKEND=none to measure the DB paths instead of the post reads cache.
+"""
+
+# 3RD PARTY IMPORTS
+from sqlalchemy import delete
+import httpx
+
+# LOCAL IMPORTS
+from app import models, oauth2, ranking
+from app.database import AsyncSessionLocal, SessionLocal, async_engine
+from app.instrumentation import QueryCounter
+from app.main import app
+from benchmarks.common import run_requests
+from benchmarks.seed import BENCH_EMAIL, BENCH_PASSWORD, seed
+
+# BUILT-IN IMPORTS
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+
+
+
+
+# Every scenario: name -> request builder (n -> (method, url, request kwargs)) from the seeded data
+# (the n-th vote goes from the user n % users to the post n // users, so every (user, post) pair is voted once)
+def build_scenarios(data: dict, tokens: list[dict], limit: int) -> dict:
+
+    users, posts = data["user_ids"], data["post_ids"]
+    voted_post = lambda n: posts[n // len(users) % len(posts)]
+
+    return {
+        "login": lambda n: ("POST", "/login", {"data": {"username": BENCH_EMAIL.format(n % len(users)), "password": BENCH_PASSWORD}}),
+        "feed (offset)": lambda n: ("GET", "/posts/", {"params": {"limit": limit, "skip": n % 10 * limit}, "headers": tokens[n % len(tokens)]}),
+        "feed (cursor)": lambda n: ("GET", "/posts/", {"params": {"limit": limit, "pagination": "cursor"}, "headers": tokens[n % len(tokens)]}),
+        "feed (hot)": lambda n: ("GET", "/posts/", {"params": {"limit": limit, "sort": "hot"}, "headers": tokens[n % len(tokens)]}),
+        "feed (substring search)": lambda n: ("GET", "/posts/", {"params": {"limit": limit, "search": f"number {n % 100}"}, "headers": tokens[n % len(tokens)]}),
+        "single post": lambda n: ("GET", f"/posts/{posts[n % len(posts)]}", {"headers": tokens[n % len(tokens)]}),
+        "create post": lambda n: ("POST", "/posts/", {"json": {"title": f"Bench created {n}", "content": "Created by the benchmark suite"},
+                                                    "headers": tokens[n % len(tokens)]}),
+        "create posts (bulk)": lambda n: ("POST", "/posts/bulk", {"json": {"items": [{"title": f"Bench bulk {n}-{i}", "content": "Created by the benchmark suite"}
+                                                                               for i in range(limit)]}, "headers": tokens[n % len(tokens)]}),
+        "vote": lambda n: ("POST", "/votes/", {"json": {"post_id": voted_post(n), "dir": 1}, "headers": tokens[n % len(users)]}),
+        "unvote": lambda n: ("POST", "/votes/", {"json": {"post_id": voted_post(n), "dir": 0}, "headers": tokens[n % len(users)]}),
+        "user list": lambda n: ("GET", "/users/", {"params": {"limit": limit, "skip": n % 10 * limit}, "headers": tokens[n % len(tokens)]}),
+    }
+
+
+# Remove the bench votes on the posts the vote / unvote scenarios will vote, so every request of them writes
+def clear_votes(user_ids: list[int], post_ids: list[int]) -> None:
+
+    db = SessionLocal()
+
+    try:
+        db.execute(delete(models.Vote).filter(models.Vote.user_id.in_(user_ids), models.Vote.post_id.in_(post_ids)))
+        db.commit()
+
+    finally:
+        db.close()
+
+
+# Commit the suite runs on, so the reports can be told apart
+def git_revision() -> str:
+
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main(args) -> dict:
+
+    data = seed(args.users, args.posts, args.votes, args.seed)
+
+    # Rank the seeded posts for the 'hot' feed
+    async with AsyncSessionLocal() as db:
+        await ranking.refresh_scores(db)
+
+    # Token of every bench user (issued with its current token version)
+    db = SessionLocal()
+    try:
+        versions = dict(db.query(models.User.id, models.User.token_version).filter(models.User.id.in_(data["user_ids"])))
+    finally:
+        db.close()
+    tokens = [{"Authorization": f"Bearer {oauth2.create_access_token(data={'user_id': id, 'ver': versions[id]})}"} for id in data["user_ids"]]
+
+    scenarios = build_scenarios(data, tokens, args.limit)
+    users, posts = data["user_ids"], data["post_ids"]
+    selected = args.scenarios or list(scenarios)
+
+    report = {"revision": git_revision(), "date": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+              "config": vars(args), "results": {}}
+
+    async with app.router.lifespan_context(app):
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+            for name in selected:
+
+                # bcrypt bound, a tenth of the requests is enough for stable figures
+                total = max(args.concurrency, args.requests // 10) if name == "login" else args.requests
+
+                # Each (user, post) pair is voted then unvoted once
+                if name in ("vote", "unvote"):
+                    total = min(total, len(users) * len(posts))
+                    if name == "vote":
+                        clear_votes(users, posts[:-(-total // len(users))])
+
+                # Warm up the pool & the statement caches before measuring (the vote scenarios can't be replayed)
+                if name not in ("vote", "unvote", "create post", "create posts (bulk)"):
+                    await run_requests(client, scenarios[name], args.concurrency, args.concurrency)
+
+                with QueryCounter(async_engine.sync_engine) as queries:
+                    result = await run_requests(client, scenarios[name], total, args.concurrency)
+
+                result["statements_per_request"] = round(queries.count / total, 2)
+                report["results"][name] = result
+
+    return report
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark every router of the app")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--votes", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario (a tenth for login)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=25, help="Page size of the list scenarios")
+    parser.add_argument("--scenarios", nargs="+", help="Subset of scenarios to run (all by default)")
+    parser.add_argument("--output", help="Write the JSON report to this file as well")
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(main(args)), indent=2)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+    print(report)
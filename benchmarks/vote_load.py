@@ -0,0 +1,167 @@
+
+"""
+Load test of the votes path on a single (viral) post, direct writes against the write-behind queue
+
+Every voter user toggles its vote on the same post as fast as it can, so all the requests fight over the same
+'posts' row. After each mode the post's 'vote_count' is checked against the votes actually stored.
+
+    python -m benchmarks.vote_load --voters 50 --rounds 20
+"""
+
+# 3RD PARTY IMPORTS
+from fastapi import FastAPI
+from sqlalchemy import func
+import httpx
+
+# LOCAL IMPORTS
+from app import models, oauth2, utils
+from app.database import SessionLocal, async_engine
+from app.instrumentation import QueryCounter
+from app.routers import vote
+from app.vote_queue import VoteQueue
+from benchmarks.common import summarize
+
+# BUILT-IN IMPORTS
+import argparse
+import asyncio
+import json
+import time
+
+
+
+
+BENCH_EMAIL = "bench-votes-{}@example.com"
+
+
+# Make sure the viral post & the voters exist and no voter has a vote on it, returns (post id, voter ids)
+def seed(voters: int) -> tuple[int, list[int]]:
+
+    db = SessionLocal()
+
+    try:
+        password = utils.hash("bench-password")
+        users = []
+
+        for n in range(voters + 1):
+            user = db.query(models.User).filter(models.User.email == BENCH_EMAIL.format(n)).first()
+            if not user:
+                user = models.User(email=BENCH_EMAIL.format(n), password=password)
+                db.add(user)
+                db.commit()
+            users.append(user.id)
+
+        owner, voter_ids = users[0], users[1:]
+        post = db.query(models.Post).filter(models.Post.owner_id == owner).first()
+        if not post:
+            post = models.Post(title="Viral post", content="Vote load test", owner_id=owner)
+            db.add(post)
+            db.commit()
+
+        reset(post.id)
+
+        return post.id, voter_ids
+
+    finally:
+        db.close()
+
+
+# Remove every vote of the post
+def reset(post_id: int) -> None:
+
+    db = SessionLocal()
+
+    try:
+        db.query(models.Vote).filter(models.Vote.post_id == post_id).delete(synchronize_session=False)
+        db.commit()
+
+    finally:
+        db.close()
+
+
+# The trigger maintained counter must match the votes stored
+def check_count(post_id: int) -> dict:
+
+    db = SessionLocal()
+
+    try:
+        stored = db.query(func.count(models.Vote.user_id)).filter(models.Vote.post_id == post_id).scalar()
+        counter = db.query(models.Post.vote_count).filter(models.Post.id == post_id).scalar()
+        return {"votes_stored": stored, "vote_count": counter, "consistent": stored == counter}
+
+    finally:
+        db.close()
+
+
+async def hammer(client: httpx.AsyncClient, post_id: int, tokens: list[str], rounds: int) -> dict:
+
+    latencies: list[float] = []
+    errors = 0
+
+    # One worker per voter: vote, unvote, vote... ending on a vote when 'rounds' is odd
+    async def voter(token: str):
+        nonlocal errors
+        for n in range(rounds):
+            start = time.perf_counter()
+            response = await client.post("/votes/", json={"post_id": post_id, "dir": 1 - n % 2},
+                                         headers={"Authorization": f"Bearer {token}"})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(voter(token) for token in tokens))
+
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def main(args) -> dict:
+
+    post_id, voter_ids = seed(args.voters)
+    tokens = [oauth2.create_access_token(data={"user_id": id, "ver": 0}) for id in voter_ids]
+
+    app = FastAPI()
+    app.include_router(vote.router)
+
+    report = {"config": vars(args), "results": {}}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+        for mode in ("direct", "write-behind"):
+
+            reset(post_id)
+
+            # Swap the queue the path operation uses
+            vote.vote_queue = VoteQueue(args.flush_size, args.flush_interval, args.queue_max) if mode == "write-behind" else None
+            if vote.vote_queue:
+                await vote.vote_queue.start()
+
+            with QueryCounter(async_engine.sync_engine) as queries:
+                result = await hammer(client, post_id, tokens, args.rounds)
+
+                # Flush what is still queued, as the lifespan does on shutdown
+                if vote.vote_queue:
+                    await vote.vote_queue.stop()
+                    result["queue"] = vote.vote_queue.stats()
+
+            result["statements_per_request"] = round(queries.count / (args.voters * args.rounds), 2)
+            result["check"] = check_count(post_id)
+            report["results"][mode] = result
+
+    vote.vote_queue = None
+    await async_engine.dispose()
+
+    return report
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Hammer a single post with votes, direct writes vs write-behind")
+    parser.add_argument("--voters", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=21)
+    parser.add_argument("--flush-size", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    parser.add_argument("--queue-max", type=int, default=10000)
+
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
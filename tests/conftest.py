@@ -0,0 +1,129 @@
+
+"""
+Shared fixtures of the test suite
+
+The settings below point the app at a throwaway Postgres (an exported variable wins over them), migrate it once
+and run the suite. The tests that need the database are skipped when it can't be reached:
+
+    createdb fastapi_test && DB_NAME=fastapi_test alembic upgrade head
+    python -m pytest -q
+"""
+
+# 3RD PARTY IMPORTS
+import pytest
+
+# LOCAL IMPORTS
+...
+
+# BUILT-IN IMPORTS
+from contextlib import asynccontextmanager
+import os
+import uuid
+
+
+
+
+# Test settings, set before the app modules read them
+TEST_SETTINGS = {
+    "DB_USER": "postgres",
+    "DB_PASS": "postgres",
+    "DB_HOSTNAME": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "fastapi_test",
+    "SECRET_KEY": "test-secret-key",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKE_EXPIRE_MINUTES": "30",
+    "BCRYPT_ROUNDS": "4",
+}
+for name, value in TEST_SETTINGS.items():
+    os.environ.setdefault(name, value)
+
+# Every read must reach the DB (the cache tests build their own cache)
+os.environ["CACHE_BACKEND"] = "none"
+
+
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+# Migrated test database, skips the test when there is none
+@pytest.fixture(scope="session")
+def database():
+
+    from sqlalchemy import text
+    from app.database import engine
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT version_num FROM alembic_version"))
+    except Exception as e:
+        pytest.skip(f"No migrated test database ({e.__class__.__name__}), run 'alembic upgrade head' on DB_NAME={os.environ['DB_NAME']}")
+
+    return engine
+
+
+# Throwaway user (removed with its posts & votes afterwards), with the headers of a token issued to it
+@asynccontextmanager
+async def throwaway_user():
+
+    from sqlalchemy import delete, insert
+    from app import models, oauth2, utils
+    from app.database import AsyncSessionLocal
+
+    email = f"test-{uuid.uuid4().hex}@example.com"
+
+    async with AsyncSessionLocal() as db:
+
+        user = (await db.execute(insert(models.User).values(email=email, password=utils.hash("test-password"))
+                                 .returning(models.User.id, models.User.token_version))).one()
+        await db.commit()
+
+        # Issued as the login does it (the version it read is current)
+        oauth2.token_versions.put(user.id, user.token_version)
+        token = oauth2.create_access_token(data={"user_id": user.id, "ver": user.token_version})
+        yield {"id": user.id, "email": email, "headers": {"Authorization": f"Bearer {token}"}}
+
+        await db.execute(delete(models.User).filter(models.User.id == user.id))
+        await db.commit()
+        oauth2.token_versions.forget(user.id)
+
+
+# Test user. Async so the event loop keeps running the lifespan tasks (e.g. a scores refresh holding locks on the posts)
+# while the user is removed
+@pytest.fixture
+async def user(database):
+
+    from app.database import async_engine
+
+    async with throwaway_user() as user:
+        yield user
+
+    # The pooled connections belong to this test's event loop
+    await async_engine.dispose()
+
+
+# Second test user, e.g. someone else reading the test user's posts
+@pytest.fixture
+async def other_user(user):
+
+    async with throwaway_user() as other_user:
+        yield other_user
+
+
+# HTTP client of the app (lifespan included), the statements of the requests run on the test database
+@pytest.fixture
+async def client(database):
+
+    import httpx
+    from app.database import async_engine
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+    # The pooled connections belong to this test's event loop
+    await async_engine.dispose()
@@ -0,0 +1,49 @@
+
+"""
+Admin endpoints access: the configured administrators only, plus the metrics scraper's token on '/admin/metrics'
+"""
+
+# 3RD PARTY IMPORTS
+import pytest
+
+# LOCAL IMPORTS
+from app import oauth2
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+ADMIN_PATHS = ["/admin/pool", "/admin/replicas", "/admin/token-cache", "/admin/cache", "/admin/vote-queue", "/admin/metrics"]
+
+
+@pytest.mark.parametrize("path", ADMIN_PATHS)
+async def test_regular_user_is_forbidden(client, user, path):
+
+    assert (await client.get(path, headers=user["headers"])).status_code == 403
+
+
+@pytest.mark.parametrize("path", ADMIN_PATHS)
+async def test_admin_is_allowed(client, user, path, monkeypatch):
+
+    monkeypatch.setattr(oauth2, "ADMIN_USER_IDS", [user["id"]])
+
+    assert (await client.get(path, headers=user["headers"])).status_code == 200
+
+
+async def test_anonymous_is_unauthorized(client):
+
+    assert (await client.get("/admin/pool")).status_code == 401
+
+
+async def test_scraper_token_only_opens_the_metrics(client, monkeypatch):
+
+    monkeypatch.setattr(oauth2, "METRICS_TOKEN", "scrape-token")
+    headers = {"Authorization": "Bearer scrape-token"}
+
+    assert (await client.get("/admin/metrics", headers=headers)).status_code == 200
+    assert (await client.get("/admin/metrics", headers={"Authorization": "Bearer wrong-token"})).status_code == 401
+    assert (await client.get("/admin/pool", headers=headers)).status_code == 401
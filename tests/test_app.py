@@ -0,0 +1,32 @@
+
+# 3RD PARTY IMPORTS
+...
+
+# LOCAL IMPORTS
+import app
+
+# BUILT-IN IMPORTS
+import importlib
+import pkgutil
+
+
+
+
+# Every module of the app imports (a class body or annotation error takes the whole app down)
+def test_every_module_imports():
+
+    for module in pkgutil.walk_packages(app.__path__, prefix="app."):
+        importlib.import_module(module.name)
+
+
+# The app builds its routes and OpenAPI schema
+def test_app_starts():
+
+    from app.main import app as server
+
+    paths = {route.path for route in server.routes}
+    assert {"/posts/", "/posts/{id}", "/posts/bulk", "/posts/export", "/users/", "/login", "/votes/", "/admin/metrics"} <= paths
+
+    schemas = server.openapi()["components"]["schemas"]
+    assert "PostCreate" in schemas
+    assert schemas["PostBulk"]["properties"]["items"]["items"] == {"$ref": "#/components/schemas/PostCreate"}
@@ -0,0 +1,36 @@
+
+"""
+Bulk posts creation, each item stands on its own
+"""
+
+# 3RD PARTY IMPORTS
+import pytest
+
+# LOCAL IMPORTS
+...
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_invalid_items_dont_fail_the_batch(client, user):
+
+    items = [{"title": "Bulk", "content": "First"}, "not an object", {"title": "Missing content"}, 42, {"title": "Bulk", "content": "Last"}]
+
+    response = await client.post("/posts/bulk", json={"items": items}, headers=user["headers"])
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created", "invalid", "invalid", "invalid", "created"]
+    assert [result["post"]["content"] for result in results if result["status"] == "created"] == ["First", "Last"]
+    assert all(result["errors"] for result in results if result["status"] == "invalid")
+
+
+async def test_empty_batch_is_rejected(client, user):
+
+    assert (await client.post("/posts/bulk", json={"items": []}, headers=user["headers"])).status_code == 422
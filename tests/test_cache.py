@@ -0,0 +1,130 @@
+
+"""
+Post reads cache, run on both backends (the Redis one on 'fakeredis')
+"""
+
+# 3RD PARTY IMPORTS
+import fakeredis
+import pytest
+
+# LOCAL IMPORTS
+from app.cache import MemoryCache, PostCache, RedisCache
+from app.routers import post
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+HEADERS = {"ETag": '"test"'}
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request) -> PostCache:
+
+    backend = MemoryCache(maxsize=4) if request.param == "memory" else RedisCache(fakeredis.aioredis.FakeRedis())
+
+    return PostCache(backend, ttl=30)
+
+
+async def test_read_through(cache):
+
+    key = await cache.post_key(1)
+    assert await cache.get_post(key) is None
+    await cache.set_post(key, HEADERS, b'{"id": 1}')
+
+    assert await cache.get_post(await cache.post_key(1)) == (HEADERS, b'{"id": 1}')
+    assert (await cache.stats())["hit_ratio"] == 0.5
+
+
+async def test_invalidation_during_a_miss_is_not_lost(cache):
+
+    # A request misses and reads the post, the post is updated & invalidated before the request writes its (stale) copy
+    key = await cache.post_key(1)
+    await cache.invalidate_post(1)
+    await cache.set_post(key, HEADERS, b'{"stale": true}')
+
+    assert await cache.get_post(await cache.post_key(1)) is None
+
+
+async def test_replica_reads_are_kept_once_settled(cache):
+
+    cache.settle = 60
+    key = await cache.feed_key(limit=10)
+    await cache.set_feed(key, HEADERS, b"[1]", [1], replica=True)
+    assert await cache.get_feed(key) is not None
+
+    # Right after an invalidation only the primary reads are kept
+    await cache.invalidate_feeds()
+    key = await cache.feed_key(limit=10)
+    await cache.set_feed(key, HEADERS, b"[1]", [1], replica=True)
+    assert await cache.get_feed(key) is None
+    await cache.set_feed(key, HEADERS, b"[1]", [1])
+    assert await cache.get_feed(key) is not None
+
+
+async def test_invalidate_post_drops_the_pages_showing_it(cache):
+
+    key = await cache.feed_key(limit=10)
+    other = await cache.feed_key(limit=20)
+    await cache.set_feed(key, HEADERS, b"[1, 2]", [1, 2])
+    await cache.set_feed(other, HEADERS, b"[3]", [3])
+
+    await cache.invalidate_post(2)
+
+    assert await cache.get_feed(key) is None
+    assert await cache.get_feed(other) is not None
+
+
+async def test_invalidation_reaches_pages_kept_alive_past_the_lru_size(cache):
+
+    key = await cache.feed_key(limit=10)
+    await cache.set_feed(key, HEADERS, b"[1]", [1])
+
+    # The page keeps being read while more pages than the LRU holds come and go
+    for n in range(10):
+        await cache.set_feed(await cache.feed_key(limit=10, skip=n), HEADERS, b"[]", [100 + n])
+        assert await cache.get_feed(key) is not None
+
+    await cache.invalidate_post(1)
+
+    assert await cache.get_feed(key) is None
+
+
+async def test_new_generation_misses_every_page(cache):
+
+    key = await cache.feed_key(limit=10)
+    await cache.set_feed(key, HEADERS, b"[1]", [1])
+
+    await cache.invalidate_feeds()
+
+    assert await cache.feed_key(limit=10) != key
+
+
+async def test_memory_footprint_follows_the_entries(cache):
+
+    empty = (await cache.stats())["memory_bytes"]
+    await cache.set_feed(await cache.feed_key(limit=10), HEADERS, b"x" * 1000, [1, 2, 3])
+    filled = (await cache.stats())["memory_bytes"]
+
+    await cache.invalidate_post(1)
+
+    assert filled > empty + 1000
+    assert (await cache.stats())["memory_bytes"] < filled
+
+
+# A post edit reaches the cached searches it now matches
+async def test_edit_invalidates_cached_searches(client, user, monkeypatch):
+
+    monkeypatch.setattr(post, "post_cache", PostCache(MemoryCache(maxsize=100), ttl=30))
+    params = {"search": "zucchini", "owner_only": True}
+
+    created = (await client.post("/posts/", json={"title": "Garden", "content": "Tomatoes"}, headers=user["headers"])).json()
+    assert (await client.get("/posts/", params=params, headers=user["headers"])).json() == []
+
+    await client.patch(f"/posts/{created['id']}", json={"content": "Zucchini everywhere"}, headers=user["headers"])
+
+    assert [item["Post"]["id"] for item in (await client.get("/posts/", params=params, headers=user["headers"])).json()] == [created["id"]]
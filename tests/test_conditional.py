@@ -0,0 +1,112 @@
+
+"""
+Conditional requests: the post reads answer 304 to a fresh If-None-Match, the PATCHes apply to the If-Match version only
+"""
+
+# 3RD PARTY IMPORTS
+import pytest
+
+# LOCAL IMPORTS
+from app import utils
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+
+def test_etag_matching():
+
+    assert utils.etag_matches('"a", "b"', '"b"')
+    assert utils.etag_matches("*", '"b"')
+    assert utils.etag_matches('W/"b"', '"b"')
+    assert not utils.etag_matches('"a"', '"b"')
+    assert not utils.etag_matches(None, '"b"')
+
+
+async def test_post_is_not_sent_again_while_unchanged(client, user):
+
+    created = (await client.post("/posts/", json={"title": "Cached", "content": "By the client"}, headers=user["headers"])).json()
+
+    first = await client.get(f"/posts/{created['id']}", headers=user["headers"])
+    assert first.status_code == 200 and first.headers["ETag"]
+
+    again = await client.get(f"/posts/{created['id']}", headers={**user["headers"], "If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+    # An edit changes the version, the post is sent in full
+    await client.patch(f"/posts/{created['id']}", json={"content": "Edited"}, headers=user["headers"])
+    edited = await client.get(f"/posts/{created['id']}", headers={**user["headers"], "If-None-Match": first.headers["ETag"]})
+    assert edited.status_code == 200
+    assert edited.json()["Post"]["content"] == "Edited"
+
+
+async def test_feed_page_is_not_sent_again_while_unchanged(client, user):
+
+    created = (await client.post("/posts/", json={"title": "Feed", "content": "Page"}, headers=user["headers"])).json()
+    params = {"owner_only": True}
+
+    first = await client.get("/posts/", params=params, headers=user["headers"])
+    assert first.status_code == 200 and first.headers["ETag"]
+
+    again = await client.get("/posts/", params=params, headers={**user["headers"], "If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+    # A vote changes the version of a post shown on the page, hence the page's
+    await client.post("/votes/", json={"post_id": created["id"], "dir": 1}, headers=user["headers"])
+    voted = await client.get("/posts/", params=params, headers={**user["headers"], "If-None-Match": first.headers["ETag"]})
+    assert voted.status_code == 200
+    assert voted.headers["ETag"] != first.headers["ETag"]
+
+
+def test_if_match_parsing():
+
+    etag = utils.post_etag(7, utils._EPOCH, 3)
+
+    assert utils.parse_if_match(f'{etag}, W/{etag}, "unknown"', "p") == [(7, utils._EPOCH, 3)]
+    assert utils.parse_if_match(etag, "u") == []
+
+
+async def test_patch_applies_only_to_the_version_read(client, user):
+
+    created = await client.post("/posts/", json={"title": "Versioned", "content": "First"}, headers=user["headers"])
+    etag = (await client.get(f"/posts/{created.json()['id']}", headers=user["headers"])).headers["ETag"]
+    url = f"/posts/{created.json()['id']}"
+
+    # The current version is updated, its new version is sent back
+    current = await client.patch(url, json={"content": "Second"}, headers={**user["headers"], "If-Match": etag})
+    assert current.status_code == 200
+    assert current.headers["ETag"] != etag
+
+    # The version read before that update is stale now
+    stale = await client.patch(url, json={"content": "Lost update"}, headers={**user["headers"], "If-Match": etag})
+    assert stale.status_code == 412
+
+    # Any version
+    assert (await client.patch(url, json={"content": "Third"}, headers={**user["headers"], "If-Match": "*"})).status_code == 200
+    assert (await client.get(url, headers=user["headers"])).json()["Post"]["content"] == "Third"
+
+
+async def test_patch_user_applies_only_to_the_version_read(client, user):
+
+    url = f"/users/{user['id']}"
+    etag = (await client.get(url, headers=user["headers"])).headers["ETag"]
+
+    current = await client.patch(url, json={"email": f"first-{user['email']}"}, headers={**user["headers"], "If-Match": etag})
+    assert current.status_code == 200
+
+    stale = await client.patch(url, json={"email": f"second-{user['email']}"}, headers={**user["headers"], "If-Match": etag})
+    assert stale.status_code == 412
+
+
+async def test_empty_patch_is_rejected(client, user):
+
+    created = (await client.post("/posts/", json={"title": "Untouched", "content": "As is"}, headers=user["headers"])).json()
+
+    assert (await client.patch(f"/posts/{created['id']}", json={}, headers=user["headers"])).status_code == 400
+    assert (await client.patch(f"/users/{user['id']}", json={}, headers=user["headers"])).status_code == 400
@@ -0,0 +1,114 @@
+
+"""
+Index usage of the queries the routers run, EXPLAINed on a data set large enough for the planner to prefer the indexes
+(no planner setting is forced, a query that stops being indexable falls back to a sequential scan and fails its check)
+"""
+
+# 3RD PARTY IMPORTS
+from sqlalchemy import delete, text
+import pytest
+
+# LOCAL IMPORTS
+from app import models
+from app.routers import post, vote
+
+# BUILT-IN IMPORTS
+from datetime import datetime, timezone
+import json
+
+
+
+
+USERS = 200
+POSTS = 20000
+
+
+# Posts, votes & scores of USERS throwaway users, analyzed so the planner sees the real volumes
+@pytest.fixture(scope="module")
+def dataset(database):
+
+    with database.begin() as conn:
+
+        users = conn.execute(text("INSERT INTO users (email, password) "
+                                  "SELECT 'explain-' || md5(random()::text) || '@example.com', 'x' FROM generate_series(1, :n) "
+                                  "RETURNING id"), {"n": USERS}).scalars().all()
+        conn.execute(text("INSERT INTO posts (title, content, owner_id) "
+                          "SELECT 'Explain post ' || n, 'Index usage check number ' || n, (:users)[1 + n % :count] FROM generate_series(1, :n) n"),
+                     {"users": users, "count": USERS, "n": POSTS})
+        conn.execute(text("INSERT INTO votes (post_id, user_id) "
+                          "SELECT posts.id, (:users)[1 + (posts.id * 7 + k) % :count] FROM posts, generate_series(0, 1) k "
+                          "WHERE posts.owner_id = ANY(:users) ON CONFLICT DO NOTHING"), {"users": users, "count": USERS})
+        conn.execute(text("INSERT INTO post_scores (post_id, hot, top) "
+                          "SELECT id, random(), vote_count FROM posts WHERE owner_id = ANY(:users) ON CONFLICT DO NOTHING"), {"users": users})
+
+    with database.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("ANALYZE users, posts, votes, post_scores")
+        post_ids = conn.execute(text("SELECT id FROM posts WHERE owner_id = ANY(:users) ORDER BY id LIMIT 5"), {"users": users}).scalars().all()
+        trigram = conn.execute(text("SELECT count(*) FROM pg_extension WHERE extname = 'pg_trgm'")).scalar()
+
+    yield {"user_id": users[0], "post_ids": post_ids, "trigram": bool(trigram)}
+
+    with database.begin() as conn:
+        conn.execute(text("DELETE FROM users WHERE id = ANY(:users)"), {"users": users})
+
+
+# Every index name found in a JSON plan
+def plan_indexes(node: dict) -> set[str]:
+
+    found = {node["Index Name"]} if "Index Name" in node else set()
+
+    for child in node.get("Plans", []):
+        found |= plan_indexes(child)
+
+    return found
+
+
+def explain(database, stmt) -> set[str]:
+
+    compiled = stmt.compile(dialect=database.dialect, compile_kwargs={"render_postcompile": True})
+
+    # EXPLAIN of a write doesn't run it
+    with database.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+
+    return plan_indexes(plan[0]["Plan"])
+
+
+# (description, statement builder (data set -> statement), any of the indexes expected in the plan)
+CHECKS = [
+    ("feed page", lambda data: post.feed_query(data["user_id"]).limit(10), {"ix_posts_created_at_id"}),
+    ("feed cursor seek", lambda data: post.feed_query(data["user_id"], after=(datetime.now(timezone.utc), 2**31 - 1)).limit(11),
+     {"ix_posts_created_at_id"}),
+    ("feed of the owner's posts", lambda data: post.feed_query(data["user_id"], owner_only=True).limit(10), {"ix_posts_owner_id"}),
+    ("feed with the voted_by_me flag", lambda data: post.feed_query(data["user_id"], voted_by_me=True).limit(10),
+     {"votes_pkey", "ix_votes_user_id"}),
+    ("hot feed page", lambda data: post.feed_query(data["user_id"], sort="hot").limit(11), {"ix_post_scores_hot"}),
+    ("top feed page", lambda data: post.feed_query(data["user_id"], sort="top").limit(11), {"ix_post_scores_top"}),
+    ("full text search", lambda data: post.feed_query(data["user_id"], search="number 42", search_mode="fulltext").limit(10),
+     {"ix_posts_search_vector"}),
+    ("vote", lambda data: vote.insert_votes(data["user_id"], data["post_ids"]), {"posts_pkey"}),
+    ("unvote", lambda data: vote.delete_votes(data["user_id"], data["post_ids"]), {"votes_pkey", "ix_votes_user_id"}),
+    # Statements the ON DELETE CASCADE foreign keys run when 'delete_user' removes a user
+    ("cascaded votes delete of a user", lambda data: delete(models.Vote).filter(models.Vote.user_id == data["user_id"]), {"ix_votes_user_id"}),
+    ("cascaded posts delete of a user", lambda data: delete(models.Post).filter(models.Post.owner_id == data["user_id"]), {"ix_posts_owner_id"}),
+]
+
+
+@pytest.mark.parametrize("description, build, expected", CHECKS, ids=[check[0] for check in CHECKS])
+def test_query_uses_index(database, dataset, description, build, expected):
+
+    used = explain(database, build(dataset))
+
+    assert used & expected, f"{description}: expected {sorted(expected)}, plan uses {sorted(used) or 'no index'}"
+
+
+def test_substring_search_uses_trigram_indexes(database, dataset):
+
+    if not dataset["trigram"]:
+        pytest.skip("pg_trgm isn't installed on the test server")
+
+    used = explain(database, post.feed_query(dataset["user_id"], search="number 4242").limit(10))
+
+    assert {"ix_posts_title_trgm", "ix_posts_content_trgm"} & used, f"plan uses {sorted(used) or 'no index'}"
@@ -0,0 +1,77 @@
+
+"""
+SQL statements budget of the post reads (catches N+1 loads such as one owner SELECT per post)
+"""
+
+# 3RD PARTY IMPORTS
+import pytest
+
+# LOCAL IMPORTS
+from app import models
+from app.database import AsyncSessionLocal, async_engine
+from app.instrumentation import QueryCounter
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+FEED_SIZE = 25
+
+
+# A full page of posts owned by the test user, the ids of the posts
+@pytest.fixture
+async def posts(user):
+
+    async with AsyncSessionLocal() as db:
+
+        posts = [models.Post(title=f"Query count post {n}", content="Query count check", owner_id=user["id"]) for n in range(FEED_SIZE)]
+        db.add_all(posts)
+        await db.commit()
+
+        return [post.id for post in posts]
+
+
+# (description, query params, statements budget)
+FEED_SCENARIOS = [
+    ("feed page (offset)", {"limit": FEED_SIZE}, 1),
+    ("feed page (cursor)", {"limit": FEED_SIZE, "pagination": "cursor"}, 1),
+    ("feed page (substring search)", {"limit": FEED_SIZE, "search": "Query count"}, 1),
+    ("feed page (full text search)", {"limit": FEED_SIZE, "search": "query", "search_mode": "fulltext"}, 1),
+    ("feed page (hot, cursor)", {"limit": FEED_SIZE, "sort": "hot", "pagination": "cursor"}, 1),
+    ("feed page (top)", {"limit": FEED_SIZE, "sort": "top"}, 1),
+    ("feed page (voted_by_me, owner_only)", {"limit": FEED_SIZE, "voted_by_me": True, "owner_only": True}, 1),
+]
+
+
+@pytest.mark.parametrize("description, params, budget", FEED_SCENARIOS, ids=[scenario[0] for scenario in FEED_SCENARIOS])
+async def test_feed_query_count(client, user, posts, description, params, budget):
+
+    with QueryCounter(async_engine.sync_engine) as queries:
+        response = await client.get("/posts/", params=params, headers=user["headers"])
+
+    assert response.status_code == 200
+    queries.assert_at_most(budget, description)
+
+
+async def test_feed_page_serves_the_owners(client, user, posts):
+
+    with QueryCounter(async_engine.sync_engine) as queries:
+        response = await client.get("/posts/", params={"limit": FEED_SIZE, "owner_only": True}, headers=user["headers"])
+
+    # A whole page of posts & owners from one statement
+    assert len(response.json()) == FEED_SIZE
+    assert all(item["Post"]["owner"]["id"] == user["id"] for item in response.json())
+    queries.assert_at_most(1, "feed page")
+
+
+async def test_single_post_query_count(client, user, posts):
+
+    with QueryCounter(async_engine.sync_engine) as queries:
+        response = await client.get(f"/posts/{posts[0]}", headers=user["headers"])
+
+    assert response.status_code == 200
+    queries.assert_at_most(1, "single post")
@@ -0,0 +1,78 @@
+
+# 3RD PARTY IMPORTS
+from sqlalchemy import delete, insert, select
+import pytest
+
+# LOCAL IMPORTS
+from app import models, ranking
+from app.database import AsyncSessionLocal
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def scores(db, post_ids: list[int]) -> dict:
+    return dict((await db.execute(select(models.PostScore.post_id, models.PostScore.top).filter(models.PostScore.post_id.in_(post_ids)))).all())
+
+
+async def queued(db, post_ids: list[int]) -> set:
+    return set((await db.execute(select(models.PostScoreQueue.post_id).filter(models.PostScoreQueue.post_id.in_(post_ids)))).scalars())
+
+
+async def test_refresh_only_reads_the_queued_posts(user):
+
+    async with AsyncSessionLocal() as db:
+
+        # New posts are queued by the trigger
+        post_ids = (await db.execute(insert(models.Post).values([{"title": f"Ranked {n}", "content": "Ranking check", "owner_id": user["id"]}
+                                                                 for n in range(3)]).returning(models.Post.id))).scalars().all()
+        await db.commit()
+        assert await queued(db, post_ids) == set(post_ids)
+
+        await ranking.refresh_scores(db)
+        assert await scores(db, post_ids) == {post_id: 0 for post_id in post_ids}
+        assert await queued(db, post_ids) == set()
+
+        # Nothing changed, nothing to refresh
+        assert await ranking.refresh_scores(db) == 0
+
+        # A vote queues its post only
+        await db.execute(insert(models.Vote).values(post_id=post_ids[0], user_id=user["id"]))
+        await db.commit()
+        assert await queued(db, post_ids) == {post_ids[0]}
+
+        assert await ranking.refresh_scores(db) == 1
+        assert (await scores(db, post_ids))[post_ids[0]] == 1
+
+
+async def test_refresh_drains_the_queue_in_batches(user):
+
+    async with AsyncSessionLocal() as db:
+
+        post_ids = (await db.execute(insert(models.Post).values([{"title": f"Batched {n}", "content": "Ranking check", "owner_id": user["id"]}
+                                                                 for n in range(7)]).returning(models.Post.id))).scalars().all()
+        await db.commit()
+
+        assert await ranking.refresh_scores(db, batch_size=3) >= 7
+        assert set(await scores(db, post_ids)) == set(post_ids)
+
+
+# The votes deleted in cascade of their post don't queue it back
+async def test_voted_post_can_be_deleted(user):
+
+    async with AsyncSessionLocal() as db:
+
+        post_id = (await db.execute(insert(models.Post).values(title="Voted", content="Ranking check", owner_id=user["id"])
+                                    .returning(models.Post.id))).scalar_one()
+        await db.execute(insert(models.Vote).values(post_id=post_id, user_id=user["id"]))
+        await db.commit()
+
+        await db.execute(delete(models.Post).filter(models.Post.id == post_id))
+        await db.commit()
+
+        assert await queued(db, [post_id]) == set()
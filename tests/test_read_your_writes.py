@@ -0,0 +1,104 @@
+
+"""
+Read-your-writes: a user that just wrote reads from the primary and past the post reads cache, the replica reads only
+fill the cache once the replicas replayed the last invalidation
+"""
+
+# 3RD PARTY IMPORTS
+import pytest
+
+# LOCAL IMPORTS
+from app import database
+from app.cache import MemoryCache, PostCache
+from app.database import AsyncSessionLocal, RecentWriters
+from app.routers import post
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+STALE = ({"ETag": '"stale"'}, b'{"stale": true}')
+
+
+@pytest.fixture
+def cache(monkeypatch) -> PostCache:
+
+    cache = PostCache(MemoryCache(maxsize=100), ttl=30)
+    monkeypatch.setattr(post, "post_cache", cache)
+
+    return cache
+
+
+# Another user reading the test user's posts
+@pytest.fixture
+def reader(other_user) -> dict:
+    return other_user["headers"]
+
+
+def test_window_is_per_user():
+
+    writers = RecentWriters(window=60)
+    writers.mark(1)
+
+    assert writers.recent(1)
+    assert not writers.recent(2)
+    assert not RecentWriters(window=0).recent(1)
+
+
+async def test_writer_skips_the_cache(client, user, reader, cache):
+
+    created = (await client.post("/posts/", json={"title": "Fresh", "content": "Just written"}, headers=user["headers"])).json()
+
+    # A copy from before the write (e.g. put back by a concurrent read)
+    await cache.set_post(await cache.post_key(created["id"]), *STALE)
+
+    assert (await client.get(f"/posts/{created['id']}", headers=reader)).content == STALE[1]
+    assert (await client.get(f"/posts/{created['id']}", headers=user["headers"])).json()["Post"]["title"] == "Fresh"
+
+
+async def test_replica_reads_fill_the_cache(client, user, reader, cache, monkeypatch):
+
+    created = (await client.post("/posts/", json={"title": "Replicated", "content": "Read from a replica"}, headers=user["headers"])).json()
+
+    # The primary stands in for a healthy replica
+    monkeypatch.setattr(database.replicas, "pick", lambda: AsyncSessionLocal)
+
+    assert (await client.get(f"/posts/{created['id']}", headers=reader)).status_code == 200
+    assert await cache.get_post(await cache.post_key(created["id"])) is not None
+
+
+async def test_replica_reads_right_after_an_invalidation_arent_kept(client, user, reader, cache, monkeypatch):
+
+    created = (await client.post("/posts/", json={"title": "Replicated", "content": "Read from a replica"}, headers=user["headers"])).json()
+    monkeypatch.setattr(database.replicas, "pick", lambda: AsyncSessionLocal)
+    monkeypatch.setattr(cache, "settle", 60)
+
+    # The replicas may not have replayed the change yet, their copies aren't kept
+    await cache.invalidate_post(created["id"])
+    assert (await client.get(f"/posts/{created['id']}", headers=reader)).status_code == 200
+    assert (await client.get("/posts/", headers=reader)).status_code == 200
+
+    assert await cache.get_post(await cache.post_key(created["id"])) is None
+    assert (await cache.stats())["memory_bytes"] == 0
+
+    # The writer reads from the primary, its read is kept
+    assert (await client.get(f"/posts/{created['id']}", headers=user["headers"])).status_code == 200
+    assert await cache.get_post(await cache.post_key(created["id"])) is not None
+
+
+async def test_idle_primary_is_no_lag(client):
+
+    # The primary replays no WAL, like a replica that replayed everything it received
+    assert await database.ReplicaSet._lag(database.async_engine) == 0
+
+
+def test_pgbouncer_url_keeps_its_query(monkeypatch):
+
+    monkeypatch.setattr(database, "DB_PGBOUNCER", True)
+    url = database._async_url("postgresql+asyncpg://app@replica:5432/fastapi?ssl=require")
+
+    assert url.query == {"ssl": "require", "prepared_statement_cache_size": "0"}
@@ -0,0 +1,79 @@
+
+"""
+Token revocation: a new password or a deleted account invalidates the tokens issued before, on every route
+"""
+
+# 3RD PARTY IMPORTS
+import pytest
+from sqlalchemy import update
+
+# LOCAL IMPORTS
+from app import models, oauth2
+from app.database import AsyncSessionLocal
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+
+def test_versions_are_trusted_for_their_ttl_only():
+
+    versions = oauth2.TokenVersions(maxsize=10, ttl=60)
+    versions.put(1, 3)
+
+    assert versions.get(1) == 3
+    assert versions.get(2) is None
+
+    versions.forget(1)
+    assert versions.get(1) is None
+
+    # No TTL, every lookup goes to the DB
+    disabled = oauth2.TokenVersions(maxsize=10, ttl=0)
+    disabled.put(1, 3)
+    assert disabled.get(1) is None
+
+
+async def test_new_password_revokes_the_old_token(client, user):
+
+    response = await client.patch(f"/users/{user['id']}", json={"password": "new-password"}, headers=user["headers"])
+    assert response.status_code == 200
+
+    # The old token is rejected by the post & vote routes too, not only by the account ones
+    assert (await client.get("/posts/", headers=user["headers"])).status_code == 401
+    assert (await client.post("/votes/", json={"post_id": 1, "dir": 1}, headers=user["headers"])).status_code == 401
+
+    # A new login works
+    login = await client.post("/login", data={"username": user["email"], "password": "new-password"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert (await client.get("/posts/", headers=headers)).status_code == 200
+
+
+async def test_email_change_keeps_the_token(client, user):
+
+    response = await client.patch(f"/users/{user['id']}", json={"email": f"renamed-{user['email']}"}, headers=user["headers"])
+    assert response.status_code == 200
+
+    assert (await client.get("/posts/", headers=user["headers"])).status_code == 200
+    assert (await client.get(f"/users/{user['id']}", headers=user["headers"])).status_code == 200
+
+
+async def test_revocation_from_another_worker_is_seen_after_the_ttl(client, user, monkeypatch):
+
+    # Another worker bumped the version, this one only sees it once its cached version expires (here: at once)
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(models.User).filter(models.User.id == user["id"]).values(token_version=models.User.token_version + 1))
+        await db.commit()
+    monkeypatch.setattr(oauth2, "token_versions", oauth2.TokenVersions(maxsize=10, ttl=0))
+
+    assert (await client.get("/posts/", headers=user["headers"])).status_code == 401
+
+
+async def test_deleted_user_token_is_rejected(client, user):
+
+    assert (await client.delete(f"/users/{user['id']}", headers=user["headers"])).status_code == 204
+
+    assert (await client.get("/posts/", headers=user["headers"])).status_code == 401
@@ -0,0 +1,43 @@
+
+# 3RD PARTY IMPORTS
+import pytest
+
+# LOCAL IMPORTS
+...
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+
+# Titles of the posts of the test user in a feed page (the test database may hold other posts)
+def own_titles(response, user) -> list:
+    return [item["Post"]["title"] for item in response.json() if item["Post"]["owner_id"] == user["id"]]
+
+
+async def test_fulltext_search_ranks_matching_posts(client, user):
+
+    for title, content in [("Gardening tips", "Tomatoes need sun"), ("Tomato soup", "A tomato recipe, tomatoes everywhere"),
+                           ("Unrelated", "Nothing to see")]:
+        response = await client.post("/posts/", json={"title": title, "content": content}, headers=user["headers"])
+        assert response.status_code == 201
+
+    response = await client.get("/posts/", params={"search": "tomatoes", "search_mode": "fulltext", "limit": 100}, headers=user["headers"])
+
+    assert response.status_code == 200
+    # Title matches weigh more than content ones
+    assert own_titles(response, user) == ["Tomato soup", "Gardening tips"]
+
+
+async def test_substring_search_matches_title_or_content(client, user):
+
+    await client.post("/posts/", json={"title": "Weekly notes", "content": "50% off_sale"}, headers=user["headers"])
+
+    response = await client.get("/posts/", params={"search": "% off_", "limit": 100}, headers=user["headers"])
+
+    assert response.status_code == 200
+    assert own_titles(response, user) == ["Weekly notes"]
@@ -0,0 +1,76 @@
+
+"""
+Votes write-behind queue: a cache failure doesn't stop the flusher, the shutdown writes whatever is left
+"""
+
+# 3RD PARTY IMPORTS
+import anyio
+import pytest
+from sqlalchemy import select
+
+# LOCAL IMPORTS
+from app import models, vote_queue
+from app.database import AsyncSessionLocal
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+
+class BrokenCache:
+
+    async def invalidate_post(self, id: int) -> None:
+        raise ConnectionError("cache is down")
+
+
+async def voted_posts(user_id: int) -> set[int]:
+
+    async with AsyncSessionLocal() as db:
+        return set((await db.execute(select(models.Vote.post_id).filter(models.Vote.user_id == user_id))).scalars().all())
+
+
+@pytest.fixture
+async def post_ids(client, user) -> list[int]:
+
+    created = [await client.post("/posts/", json={"title": f"Queued {n}", "content": "Votes"}, headers=user["headers"]) for n in range(2)]
+
+    return [response.json()["id"] for response in created]
+
+
+async def test_cache_failure_keeps_the_flusher_running(user, post_ids, monkeypatch):
+
+    monkeypatch.setattr(vote_queue, "post_cache", BrokenCache())
+    queue = vote_queue.VoteQueue(flush_size=1, flush_interval=0.01, maxsize=100)
+    await queue.start()
+
+    assert queue.submit(user["id"], post_ids[0], 1)
+    with anyio.fail_after(5):
+        while queue.stats()["flushes"] < 1:
+            await anyio.sleep(0.01)
+
+    assert queue.running
+    assert queue.submit(user["id"], post_ids[1], 1)
+    await queue.stop()
+
+    assert await voted_posts(user["id"]) == set(post_ids)
+
+
+async def test_stop_writes_the_votes_of_a_dead_flusher(user, post_ids):
+
+    queue = vote_queue.VoteQueue(flush_size=100, flush_interval=60, maxsize=100)
+    await queue.start()
+
+    for post_id in post_ids:
+        assert queue.submit(user["id"], post_id, 1)
+
+    queue._task.cancel()
+    await anyio.sleep(0)
+    assert not queue.running
+
+    await queue.stop()
+
+    assert await voted_posts(user["id"]) == set(post_ids)
@@ -0,0 +1,70 @@
+
+"""
+Votes: the single vote errors and the outcome of every item of a batch
+"""
+
+# 3RD PARTY IMPORTS
+import pytest
+
+# LOCAL IMPORTS
+...
+
+# BUILT-IN IMPORTS
+...
+
+
+
+
+pytestmark = pytest.mark.anyio
+
+MISSING_POST = 2**31 - 1
+
+
+@pytest.fixture
+async def post_ids(client, user) -> list[int]:
+
+    created = [await client.post("/posts/", json={"title": f"Voted {n}", "content": "Votes"}, headers=user["headers"]) for n in range(3)]
+
+    return [response.json()["id"] for response in created]
+
+
+async def test_vote_and_unvote(client, user, post_ids):
+
+    vote = {"post_id": post_ids[0], "dir": 1}
+
+    assert (await client.post("/votes/", json=vote, headers=user["headers"])).status_code == 201
+    assert (await client.post("/votes/", json=vote, headers=user["headers"])).status_code == 409
+
+    assert (await client.post("/votes/", json={**vote, "dir": 0}, headers=user["headers"])).status_code == 201
+    assert (await client.post("/votes/", json={**vote, "dir": 0}, headers=user["headers"])).status_code == 404
+
+
+async def test_vote_on_a_missing_post(client, user):
+
+    for dir in (1, 0):
+        response = await client.post("/votes/", json={"post_id": MISSING_POST, "dir": dir}, headers=user["headers"])
+        assert response.status_code == 404
+        assert str(MISSING_POST) in response.json()["detail"]
+
+
+async def test_batch_outcomes(client, user, post_ids):
+
+    voted, unvoted, flipped = post_ids
+    await client.post("/votes/", json={"post_id": voted, "dir": 1}, headers=user["headers"])
+
+    items = [
+        {"post_id": voted, "dir": 1},          # already voted
+        {"post_id": unvoted, "dir": 0},        # never voted
+        {"post_id": flipped, "dir": 0},        # superseded by the next item
+        {"post_id": flipped, "dir": 1},
+        {"post_id": MISSING_POST, "dir": 1},
+    ]
+    response = await client.post("/votes/batch", json={"items": items}, headers=user["headers"])
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == \
+        ["already_voted", "not_voted", "superseded", "added", "post_not_found"]
+
+    # Last item wins: the vote is cast, retracting it in a new batch deletes it
+    response = await client.post("/votes/batch", json={"items": [{"post_id": flipped, "dir": 0}]}, headers=user["headers"])
+    assert [result["status"] for result in response.json()["results"]] == ["deleted"]